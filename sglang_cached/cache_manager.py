@@ -5,16 +5,47 @@ Provides in-memory caching with asynchronous file persistence. The cache stores
 multiple responses per cache key to support the `n` parameter (number of completions).
 """
 
-import json
+import mmap
 import os
-import queue
 import threading
 import time
+from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import orjson
+
 from .hashing import generate_cache_key, extract_n_parameter
 
+# Bump the version whenever the cache key scheme changes
+CACHE_FILE_NAME = "cache_v2.jsonl"
+
+# Number of independently locked partitions of the in-memory cache (power of two)
+NUM_SHARDS = 32
+
+# Linux-only (Python 3.10+) flag to prefault a whole mapping when it is created
+_MAP_POPULATE = getattr(mmap, "MAP_POPULATE", 0)
+
+
+class _Counter:
+    """Thread-safe counter with its own lock, so counting never extends a cache critical section."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def increment(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    def reset(self):
+        with self._lock:
+            self._value = 0
+
+    @property
+    def value(self) -> int:
+        return self._value
+
 
 class CacheManager:
     """
@@ -23,35 +54,78 @@ class CacheManager:
     The cache is a mapping from cache keys to lists of responses. Each cache key
     represents a unique combination of input and sampling parameters (excluding `n`).
     Multiple responses can be stored per key to handle different `n` values.
+
+    The mapping is split into `NUM_SHARDS` shards, each guarded by its own lock, so
+    concurrent requests for different keys do not contend on a single mutex.
+
+    When a capacity is set, each shard is kept in least-recently-used order and a
+    put that pushes the number of keys over capacity evicts the least recently
+    used key of its shard, falling back to other shards once its own holds only
+    the new key. This approximates a global LRU, and the capacity is a soft bound:
+    concurrent puts can briefly leave the cache over it.
+
+    Used as a context manager, the cache is shut down on exit, which drains any
+    pending writes to disk.
     """
 
-    def __init__(self, cache_dir: Optional[str] = None, overwrite: bool = False):
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        overwrite: bool = False,
+        capacity: Optional[int] = None,
+        bypass_page_cache: bool = False
+    ):
         """
         Initialize the cache manager.
 
         Args:
             cache_dir: Directory to store cache file. Defaults to ~/.sglang_cache
             overwrite: If True, remove existing cache file before loading
+            capacity: Maximum number of cache keys to keep, at least 1. None means
+                unbounded
+
+        Raises:
+            ValueError: If `capacity` is less than 1
+            bypass_page_cache: If True, drop the cache file from the OS page cache
+                after loading it and after each write, since every response is
+                already held in memory. Ignored where posix_fadvise is unavailable
         """
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+
         if cache_dir is None:
             cache_dir = os.path.expanduser("~/.sglang_cache")
 
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_file = self.cache_dir / "cache.jsonl"
-
-        # In-memory cache: cache_key -> list of responses
-        self._cache: Dict[str, List[Dict]] = {}
-        self._lock = threading.Lock()
-
-        # Async writer
-        self._write_queue: queue.Queue = queue.Queue()
+        # Versioned so caches keyed by an older hash scheme are never mixed in
+        self.cache_file = self.cache_dir / CACHE_FILE_NAME
+
+        # In-memory cache: cache_key -> list of responses, partitioned into shards
+        # Each shard is ordered from least to most recently used
+        self._shards: List[OrderedDict] = [OrderedDict() for _ in range(NUM_SHARDS)]
+        self._shard_locks = [threading.Lock() for _ in range(NUM_SHARDS)]
+        self.capacity = capacity
+        self.bypass_page_cache = bypass_page_cache and hasattr(os, "posix_fadvise")
+
+        # Async writer: deque append/popleft are atomic, the event wakes the writer
+        self._write_deque: deque = deque()
+        self._wake = threading.Event()
         self._writer_thread: Optional[threading.Thread] = None
         self._shutdown = threading.Event()
 
-        # Stats
-        self._hits = 0
-        self._misses = 0
+        # Append-only log state (owned by the writer thread)
+        self._file_lock = threading.Lock()
+        self._file_handle = None
+        self._file_bytes = 0
+        self._record_bytes: Dict[str, int] = {}
+        self._live_bytes = 0
+
+        # Stats, updated outside the shard locks
+        self._hits = _Counter()
+        self._misses = _Counter()
+        self._total_responses = _Counter()
+        self._bypassed = _Counter()
 
         # Remove existing cache if overwrite is requested
         if overwrite and self.cache_file.exists():
@@ -63,159 +137,547 @@ class CacheManager:
         self._start_writer()
 
     def _load_cache(self):
-        """Load cache from disk into memory."""
+        """
+        Load cache from disk into memory.
+
+        The cache file is an append-only log. A record either carries the full
+        response list for a key (`responses`, written by compaction and older
+        versions), responses appended since the previous record (`delta`), or
+        marks the key as evicted (`evicted`).
+
+        The file is memory-mapped and split on newlines with `mmap.find`, so each
+        record is parsed straight from the mapped bytes. Every record is read, so
+        where supported the mapping is populated up front rather than faulting in
+        page by page during the scan.
+
+        A line that fails to parse or is not a well-formed record is skipped. A
+        last line without a newline is a record torn by a crash mid-write: it is
+        truncated away before the writer opens the file for appending, otherwise
+        the next record would be glued onto it and lost as well.
+        """
         if not self.cache_file.exists():
             return
 
+        torn_at = None
         try:
-            with open(self.cache_file, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        entry = json.loads(line)
-                        cache_key = entry["cache_key"]
-                        responses = entry["responses"]
-                        self._cache[cache_key] = responses
+            with open(self.cache_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    return
+                if _MAP_POPULATE:
+                    mm = mmap.mmap(
+                        f.fileno(), 0, flags=mmap.MAP_SHARED | _MAP_POPULATE, prot=mmap.PROT_READ
+                    )
+                else:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                with mm:
+                    start = 0
+                    while start < size:
+                        end = mm.find(b'\n', start)
+                        if end == -1:
+                            torn_at = start
+                            break
+                        line = mm[start:end]
+                        if line.strip():
+                            try:
+                                self._apply_record(orjson.loads(line), end + 1 - start)
+                            except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+                                print(f"Warning: Skipping corrupt record at byte {start} of {self.cache_file}: {e!r}")
+                                # Dead bytes, reclaimed by the next compaction
+                                self._file_bytes += end + 1 - start
+                        start = end + 1
+                if self.bypass_page_cache:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            if torn_at is not None:
+                print(f"Warning: Truncating torn record at byte {torn_at} of {self.cache_file}")
+                os.truncate(self.cache_file, torn_at)
         except Exception as e:
             print(f"Warning: Failed to load cache from {self.cache_file}: {e}")
 
+        # The capacity may have shrunk since the cache was written
+        for index in range(NUM_SHARDS):
+            self._evict_over_capacity(index)
+
+    def _apply_record(self, entry: Dict, num_bytes: int):
+        """Apply one log record to the in-memory cache while loading."""
+        cache_key = entry["cache_key"]
+        shard = self._shards[self._shard_index(cache_key)]
+        if "delta" in entry:
+            shard.setdefault(cache_key, []).extend(entry["delta"])
+            shard.move_to_end(cache_key)
+            self._total_responses.increment(len(entry["delta"]))
+            self._track_record(cache_key, num_bytes, replaces=False)
+        elif "evicted" in entry:
+            self._total_responses.increment(-len(shard.pop(cache_key, ())))
+            self._track_eviction(cache_key, num_bytes)
+        else:
+            previous = shard.get(cache_key, ())
+            shard[cache_key] = entry["responses"]
+            shard.move_to_end(cache_key)
+            self._total_responses.increment(len(entry["responses"]) - len(previous))
+            self._track_record(cache_key, num_bytes, replaces=True)
+
+    @staticmethod
+    def _shard_index(cache_key: str) -> int:
+        """Map a cache key to the index of the shard that owns it."""
+        return hash(cache_key) & (NUM_SHARDS - 1)
+
+    def _track_record(self, cache_key: str, num_bytes: int, replaces: bool):
+        """
+        Account for a record appended to the log for compaction decisions.
+
+        A full-list record supersedes every earlier record for its key, while a
+        delta record adds to them.
+        """
+        previous = self._record_bytes.get(cache_key, 0)
+        self._file_bytes += num_bytes
+        if replaces:
+            self._live_bytes += num_bytes - previous
+            self._record_bytes[cache_key] = num_bytes
+        else:
+            self._live_bytes += num_bytes
+            self._record_bytes[cache_key] = previous + num_bytes
+
+    def _track_eviction(self, cache_key: str, num_bytes: int):
+        """Account for an eviction record, which makes the key's records dead."""
+        self._file_bytes += num_bytes
+        self._live_bytes -= self._record_bytes.pop(cache_key, 0)
+
+    def _num_keys(self) -> int:
+        """Total number of keys across all shards (len() is atomic, no locks needed)."""
+        return sum(len(shard) for shard in self._shards)
+
+    def _evict_over_capacity(self, index: int):
+        """
+        Evict least recently used keys while the cache is over capacity.
+
+        Keys are evicted from shard `index` first, keeping its most recently used
+        key. The rest come from the least recently used ends of the other shards,
+        skipping any whose lock is held by another thread: blocking on it while
+        holding this shard's lock could deadlock. Eviction is therefore best
+        effort: two concurrent puts that each skip the other's shard can both
+        return with the cache over capacity, until a later put evicts again.
+        Must be called with the shard's lock held (or before the writer starts).
+        """
+        if self.capacity is None:
+            return
+        shard = self._shards[index]
+        while len(shard) > 1 and self._num_keys() > self.capacity:
+            self._evict_lru(shard)
+
+        for offset in range(1, NUM_SHARDS):
+            if self._num_keys() <= self.capacity:
+                return
+            other = (index + offset) & (NUM_SHARDS - 1)
+            lock = self._shard_locks[other]
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                other_shard = self._shards[other]
+                while other_shard and self._num_keys() > self.capacity:
+                    self._evict_lru(other_shard)
+            finally:
+                lock.release()
+
+    def _evict_lru(self, shard: OrderedDict):
+        """Evict the least recently used key of a shard. The shard's lock must be held."""
+        evicted_key, evicted_responses = shard.popitem(last=False)
+        self._total_responses.increment(-len(evicted_responses))
+        # A None delta is a tombstone for the writer
+        self._enqueue_write(evicted_key, None)
+
     def _start_writer(self):
         """Start the async writer thread."""
         self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
         self._writer_thread.start()
 
+    def _enqueue_write(self, cache_key: str, delta: Optional[List[Dict]]):
+        """Hand a write to the writer thread without taking a lock."""
+        self._write_deque.append((cache_key, delta))
+        self._wake.set()
+
     def _writer_loop(self):
         """Background thread that writes cache updates to disk."""
         while not self._shutdown.is_set():
-            try:
-                # Wait for write requests with timeout to check shutdown flag
-                cache_key, responses = self._write_queue.get(timeout=1.0)
-                self._write_to_disk(cache_key, responses)
-                self._write_queue.task_done()
-            except queue.Empty:
+            # Wait for write requests with timeout to check shutdown flag
+            if not self._wake.wait(timeout=1.0):
                 continue
+            # Clear before draining so a write appended meanwhile re-arms the event
+            self._wake.clear()
+            self._write_pending()
+
+        # Drain anything queued before shutdown, then make it durable. Compaction
+        # requeues flush() barriers, so repeat until nothing is left for them
+        self._write_pending(sync=True)
+        while self._write_deque:
+            self._write_pending(sync=True)
+
+    def _write_pending(self, sync: bool = False):
+        """Write every queued entry, then release any flush() callers waiting on it."""
+        batch: List[Tuple[str, Optional[List[Dict]]]] = []
+        barriers: List[threading.Event] = []
+        # Drain under the file lock so clear() cannot run between draining a
+        # batch and writing it, which would write cleared entries to a new log
+        with self._file_lock:
+            self._drain_into(batch, barriers)
+            self._write_batch(batch)
+            if sync:
+                self._close_file(sync=True)
+        for barrier in barriers:
+            barrier.set()
+
+    def _drain_into(
+        self,
+        batch: List[Tuple[str, Optional[List[Dict]]]],
+        barriers: List[threading.Event]
+    ):
+        """Move every write currently queued into `batch` without blocking."""
+        while self._write_deque:
+            item = self._write_deque.popleft()
+            if isinstance(item, threading.Event):
+                barriers.append(item)
+            else:
+                batch.append(item)
 
-    def _write_to_disk(self, cache_key: str, responses: List[Dict]):
+    def _write_batch(self, batch: List[Tuple[str, Optional[List[Dict]]]]):
         """
-        Write a single cache entry to disk.
-
-        Uses atomic write pattern: write to temp file, then rename.
+        Append a batch of cache entries to disk with a single write.
+
+        Entries are appended to the log rather than rewriting the whole file, so
+        each write costs O(new responses). Each queued item holds only the
+        responses added by one `put`, so the deltas for a key are merged into a
+        single record. A `None` item is an eviction tombstone. Superseded records
+        are reclaimed by `_compact` once they make up more than half of the file.
+        Must be called with `_file_lock` held.
         """
-        try:
-            # Read existing cache
-            existing_cache = {}
-            if self.cache_file.exists():
-                with open(self.cache_file, 'r') as f:
-                    for line in f:
-                        if line.strip():
-                            entry = json.loads(line)
-                            existing_cache[entry["cache_key"]] = entry["responses"]
-
-            # Update with new entry
-            existing_cache[cache_key] = responses
+        if not batch:
+            return
 
-            # Write atomically
-            temp_file = self.cache_file.with_suffix('.tmp')
-            with open(temp_file, 'w') as f:
-                for key, resps in existing_cache.items():
-                    entry = {"cache_key": key, "responses": resps}
-                    f.write(json.dumps(entry) + '\n')
+        try:
+            # cache_key -> (record kind, responses) after applying the batch in order
+            pending: Dict[str, Tuple[str, List[Dict]]] = {}
+            for cache_key, new_responses in batch:
+                kind, responses = pending.get(cache_key, ("delta", []))
+                if new_responses is None:
+                    pending[cache_key] = ("evicted", [])
+                elif kind == "evicted":
+                    # Re-added after eviction: the new responses are the whole list
+                    pending[cache_key] = ("responses", list(new_responses))
+                else:
+                    pending[cache_key] = (kind, responses + new_responses)
+
+            lines = []
+            for cache_key, (kind, responses) in pending.items():
+                record = {"cache_key": cache_key, kind: True if kind == "evicted" else responses}
+                lines.append((cache_key, kind, orjson.dumps(record) + b'\n'))
+
+            if self._file_handle is None:
+                self._file_handle = open(self.cache_file, 'ab')
+            self._file_handle.writelines(line for _, _, line in lines)
+            self._file_handle.flush()
+            if self.bypass_page_cache:
+                # Pages must be written back before they can be dropped
+                fd = self._file_handle.fileno()
+                os.fdatasync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            for cache_key, kind, line in lines:
+                if kind == "evicted":
+                    self._track_eviction(cache_key, len(line))
+                else:
+                    self._track_record(cache_key, len(line), replaces=(kind == "responses"))
 
-            # Atomic rename
-            temp_file.replace(self.cache_file)
+            if self._file_bytes > 2 * self._live_bytes:
+                self._compact()
 
         except Exception as e:
             print(f"Warning: Failed to write cache to disk: {e}")
 
-    def get(self, request_data: Dict) -> Tuple[List[Dict], int]:
+    def _compact(self):
+        """
+        Rewrite the log with only the live entries.
+
+        Uses atomic write pattern: write to temp file, then rename. Must be called
+        with `_file_lock` held, from the writer thread.
+
+        The snapshot is taken with every shard locked, so no put or eviction can
+        queue a write meanwhile. Writes still queued at that point are already
+        reflected in the snapshot and are dropped, otherwise they would be appended
+        again after it and duplicated on reload. Queued flush() barriers are kept.
+        """
+        for lock in self._shard_locks:
+            lock.acquire()
+        try:
+            snapshot = [
+                (key, resps.copy()) for shard in self._shards for key, resps in shard.items()
+            ]
+            self._discard_queued_writes()
+        finally:
+            for lock in self._shard_locks:
+                lock.release()
+
+        self._close_file()
+        self._file_bytes = 0
+        self._live_bytes = 0
+        self._record_bytes = {}
+
+        temp_file = self.cache_file.with_suffix('.tmp')
+        with open(temp_file, 'wb') as f:
+            for key, resps in snapshot:
+                line = orjson.dumps({"cache_key": key, "responses": resps}) + b'\n'
+                f.write(line)
+                self._track_record(key, len(line), replaces=True)
+
+        # Atomic rename
+        temp_file.replace(self.cache_file)
+
+    def _discard_queued_writes(self):
+        """
+        Drop every queued write, keeping flush() barriers queued in order.
+
+        Must be called with every shard lock held, so no write can be queued meanwhile.
+        """
+        superseded: List[Tuple[str, Optional[List[Dict]]]] = []
+        barriers: List[threading.Event] = []
+        self._drain_into(superseded, barriers)
+        if barriers:
+            self._write_deque.extendleft(reversed(barriers))
+            self._wake.set()
+
+    def _close_file(self, sync: bool = False):
+        """Close the log file handle, optionally fsyncing it first."""
+        if self._file_handle is None:
+            return
+        try:
+            if sync:
+                self._file_handle.flush()
+                os.fsync(self._file_handle.fileno())
+        finally:
+            self._file_handle.close()
+            self._file_handle = None
+
+    def resolve(self, request_data: Dict) -> Tuple[str, int]:
+        """
+        Resolve a request to its cache key and requested `n`.
+
+        Hashing the request is the expensive part of a lookup, so callers that
+        both read and write the same request should resolve it once and use
+        `get_by_key` / `put_by_key`.
+
+        Args:
+            request_data: The request dictionary
+
+        Returns:
+            Tuple of (cache_key, n)
+        """
+        return generate_cache_key(request_data), extract_n_parameter(request_data)
+
+    def get(
+        self,
+        request_data: Dict,
+        *,
+        n: Optional[int] = None
+    ) -> Tuple[Tuple[Dict, ...], int]:
         """
         Get cached responses for a request.
 
+        Args:
+            request_data: The request dictionary
+            n: Number of responses wanted, overriding the request's own `n`.
+                `n` is not part of the cache key, so this avoids rebuilding the
+                request just to ask for a different count
+
+        Returns:
+            Tuple of (cached_responses, num_needed), see `get_by_key`
+        """
+        cache_key, request_n = self.resolve(request_data)
+        return self.get_by_key(cache_key, n=request_n if n is None else n)
+
+    def get_by_key(
+        self,
+        cache_key: str,
+        *,
+        n: int,
+        record_stats: bool = True
+    ) -> Tuple[Tuple[Dict, ...], int]:
+        """
+        Get cached responses for an already resolved cache key.
+
         Implements the key `n` parameter logic:
         - If cache has >= n responses: return first n
         - If cache has < n responses: return all cached + number of additional needed
 
+        The responses are returned as a tuple so callers get a read-only snapshot
+        (built straight from the cached list, or from a slice of it when only the
+        first n are wanted); the response dicts themselves are shared with the
+        cache and must not be mutated.
+
         Args:
-            request_data: The request dictionary
+            cache_key: Cache key from `resolve`
+            n: Number of responses requested
+            record_stats: Whether to count this lookup as a hit or miss. Re-reads
+                of a key for a request that was already counted should pass False
 
         Returns:
             Tuple of (cached_responses, num_needed)
-            - cached_responses: List of cached responses (may be empty)
+            - cached_responses: Tuple of cached responses (may be empty)
             - num_needed: Number of additional responses needed from SGLang
         """
-        cache_key = generate_cache_key(request_data)
-        n = extract_n_parameter(request_data)
+        index = self._shard_index(cache_key)
 
-        with self._lock:
-            cached_responses = self._cache.get(cache_key, [])
+        with self._shard_locks[index]:
+            cached_responses = self._shards[index].get(cache_key, ())
             num_cached = len(cached_responses)
 
-            if num_cached >= n:
-                # Full cache hit - return a copy
-                self._hits += 1
-                return cached_responses[:n].copy(), 0
+            if num_cached > 0:
+                self._shards[index].move_to_end(cache_key)
+
+            if num_cached > n:
+                # Full cache hit with responses to spare - return the first n
+                result = tuple(cached_responses[:n]), 0
             else:
-                # Partial or full miss - return a copy to avoid aliasing issues
-                if num_cached > 0:
-                    self._hits += 1  # Partial hit
-                else:
-                    self._misses += 1  # Full miss
-                return cached_responses.copy(), n - num_cached
+                # Exact hit, partial hit or miss - snapshot everything cached
+                result = tuple(cached_responses), n - num_cached
+
+        # Full and partial hits count as hits, only an empty entry is a miss
+        if record_stats:
+            if num_cached > 0:
+                self._hits.increment()
+            else:
+                self._misses.increment()
+        return result
 
     def put(self, request_data: Dict, new_responses: List[Dict]):
         """
         Add new responses to the cache.
 
+        Args:
+            request_data: The request dictionary
+            new_responses: List of new response dicts to add to cache
+        """
+        if not new_responses:
+            return
+
+        self.put_by_key(generate_cache_key(request_data), new_responses)
+
+    def put_by_key(self, cache_key: str, new_responses: List[Dict]):
+        """
+        Add new responses to the cache under an already resolved cache key.
+
         This appends new responses to the existing cached responses for this key.
-        The write to disk happens asynchronously.
+        The write to disk happens asynchronously and only carries the new responses.
 
         Args:
-            request_data: The request dictionary
+            cache_key: Cache key from `resolve`
             new_responses: List of new response dicts to add to cache
         """
         if not new_responses:
             return
 
-        cache_key = generate_cache_key(request_data)
+        delta = new_responses[:]
+        index = self._shard_index(cache_key)
 
-        with self._lock:
+        with self._shard_locks[index]:
             # Append to existing responses
-            if cache_key not in self._cache:
-                self._cache[cache_key] = []
-            self._cache[cache_key].extend(new_responses)
+            shard = self._shards[index]
+            if cache_key not in shard:
+                shard[cache_key] = []
+            shard[cache_key].extend(delta)
+            shard.move_to_end(cache_key)
+            self._total_responses.increment(len(delta))
 
-            # Queue async write
-            responses_copy = self._cache[cache_key].copy()
-
-        # Non-blocking: queue the write operation
-        self._write_queue.put((cache_key, responses_copy))
+            # Queue async write before any tombstones so they stay ordered
+            self._enqueue_write(cache_key, delta)
+            self._evict_over_capacity(index)
 
     def clear(self):
-        """Clear all cached responses."""
-        with self._lock:
-            self._cache.clear()
-            self._hits = 0
-            self._misses = 0
+        """
+        Clear all cached responses.
 
-        # Clear file
-        if self.cache_file.exists():
-            self.cache_file.unlink()
+        Locks are taken in the same order as `_compact`. With every shard locked
+        and the writer held off by the file lock, the writes still queued are
+        dropped along with the log, so none of them can land in the new log.
+        """
+        with self._file_lock:
+            for lock in self._shard_locks:
+                lock.acquire()
+            try:
+                for shard in self._shards:
+                    shard.clear()
+                self._total_responses.reset()
+                self._discard_queued_writes()
+
+                self._close_file()
+                self._file_bytes = 0
+                self._live_bytes = 0
+                self._record_bytes = {}
+                if self.cache_file.exists():
+                    self.cache_file.unlink()
+            finally:
+                for lock in self._shard_locks:
+                    lock.release()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset hit, miss and bypass counters, keeping cached responses."""
+        self._hits.reset()
+        self._misses.reset()
+        self._bypassed.reset()
+
+    def record_bypass(self):
+        """Count a request that was served without consulting the cache."""
+        self._bypassed.increment()
 
     def get_stats(self) -> Dict:
-        """Get cache statistics."""
-        with self._lock:
-            return {
-                "num_keys": len(self._cache),
-                "total_responses": sum(len(v) for v in self._cache.values()),
-                "hits": self._hits,
-                "misses": self._misses,
-                "hit_rate": self._hits / (self._hits + self._misses) if (self._hits + self._misses) > 0 else 0.0,
-                "cache_file": str(self.cache_file),
-                "pending_writes": self._write_queue.qsize()
-            }
+        """Get cache statistics (constant time, takes no shard locks)."""
+        hits = self._hits.value
+        misses = self._misses.value
+
+        return {
+            "num_keys": self._num_keys(),
+            "total_responses": self._total_responses.value,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if (hits + misses) > 0 else 0.0,
+            "cache_bypassed": self._bypassed.value,
+            "cache_file": str(self.cache_file),
+            "pending_writes": len(self._write_deque)
+        }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every write queued before this call is in the cache file.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            True if the writes were flushed, False if the timeout expired
+        """
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            # Nothing left to write: shutdown() already drained the queue
+            return True
+
+        barrier = threading.Event()
+        self._write_deque.append(barrier)
+        self._wake.set()
+        return barrier.wait(timeout)
+
+    def __enter__(self) -> "CacheManager":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
 
     def shutdown(self):
         """Shutdown the cache manager and wait for pending writes."""
         self._shutdown.set()
+        self._wake.set()
         if self._writer_thread and self._writer_thread.is_alive():
-            # Wait for thread to finish (it checks shutdown flag every 1s)
+            # Wait for thread to finish (woken above, it checks the shutdown flag next)
             self._writer_thread.join(timeout=2.0)
+        if self._writer_thread and not self._writer_thread.is_alive():
+            # Release flush() callers that queued a barrier as the writer exited
+            barriers: List[threading.Event] = []
+            self._drain_into([], barriers)
+            for barrier in barriers:
+                barrier.set()
@@ -5,6 +5,7 @@ Starts an HTTP server that wraps an existing SGLang server with caching.
 """
 
 import argparse
+import asyncio
 import sys
 
 import requests
@@ -21,6 +22,14 @@ def check_sglang_server(url: str) -> bool:
         return False
 
 
+def positive_int(value: str) -> int:
+    """Parse a command-line integer that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
     """Main entry point for sglang-cached CLI."""
     parser = argparse.ArgumentParser(
@@ -71,6 +80,22 @@ def main():
         action="store_true",
         help="Remove existing cache and start fresh"
     )
+    start_parser.add_argument(
+        "--cache-capacity",
+        type=positive_int,
+        default=None,
+        help="Maximum number of cache keys to keep, evicting least recently used (default: unbounded)"
+    )
+    start_parser.add_argument(
+        "--bypass-page-cache",
+        action="store_true",
+        help="Keep the cache file out of the OS page cache (responses are already held in memory)"
+    )
+    start_parser.add_argument(
+        "--deterministic-only",
+        action="store_true",
+        help="Only cache requests with temperature 0 or a fixed seed; forward sampled requests uncached"
+    )
 
     args = parser.parse_args()
 
@@ -94,7 +119,10 @@ def main():
         sglang_url=args.sglang_url,
         cache_dir=args.cache_path,
         verbose=not args.quiet,
-        overwrite_cache=args.overwrite_cache
+        overwrite_cache=args.overwrite_cache,
+        cache_capacity=args.cache_capacity,
+        bypass_page_cache=args.bypass_page_cache,
+        cache_deterministic_only=args.deterministic_only
     )
 
     print("\n" + "=" * 70)
@@ -110,6 +138,8 @@ def main():
     print("  GET    /health                    - Health check")
     print("  GET    /cache/stats               - Cache statistics")
     print("  POST   /cache/clear               - Clear cache")
+    print("  POST   /cache/flush               - Flush cache writes to disk")
+    print("  POST   /cache/reset_stats         - Reset cache statistics")
     print("  GET    /cache/info                - Detailed cache info")
     print("\nExample usage:")
     print(f'  curl -X POST http://localhost:{args.port}/generate \\')
@@ -123,11 +153,11 @@ def main():
         cached_server.run(host=args.host, port=args.port)
     except KeyboardInterrupt:
         print("\n\nShutting down gracefully...")
-        cached_server.shutdown()
+        asyncio.run(cached_server.shutdown())
         print("✓ Cache saved and shutdown complete")
     except Exception as e:
         print(f"\nERROR: Failed to start server: {e}")
-        cached_server.shutdown()
+        asyncio.run(cached_server.shutdown())
         sys.exit(1)
 
 
@@ -7,10 +7,11 @@ the cache key, since we want to reuse cached responses regardless of how many co
 are requested.
 """
 
-import hashlib
-import json
 from typing import Any, Dict
 
+import orjson
+import xxhash
+
 
 def normalize_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -35,8 +36,6 @@ def normalize_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
     Raises:
         ValueError: If the `model` field is missing from the request
     """
-    import copy
-
     # Validate that model is present
     if "model" not in request_data:
         raise ValueError(
@@ -45,17 +44,19 @@ def normalize_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
             "to ensure correct cache behavior."
         )
 
-    # Deep copy to avoid modifying the original
-    normalized = copy.deepcopy(request_data)
-
-    # Remove 'n' from top level (OpenAI-compatible API)
-    normalized.pop("n", None)
-
-    # Remove 'n' from sampling_params if present
-    if "sampling_params" in normalized and isinstance(normalized["sampling_params"], dict):
-        normalized["sampling_params"].pop("n", None)
-        # Remove empty sampling_params dict if it becomes empty
-        if not normalized["sampling_params"]:
+    # Shallow copy without 'n' (OpenAI-compatible API). Nested values are shared
+    # with the original, which is safe because they are only read for hashing
+    normalized = {k: v for k, v in request_data.items() if k != "n"}
+
+    # Remove 'n' from sampling_params if present. The dict is only copied when
+    # there is an 'n' to drop; otherwise the original is shared
+    sampling_params = normalized.get("sampling_params")
+    if isinstance(sampling_params, dict):
+        if "n" in sampling_params:
+            sampling_params = {k: v for k, v in sampling_params.items() if k != "n"}
+            normalized["sampling_params"] = sampling_params
+        # Remove empty sampling_params dict, whether it was empty or held only 'n'
+        if not sampling_params:
             normalized.pop("sampling_params")
 
     return normalized
@@ -65,7 +66,9 @@ def generate_cache_key(request_data: Dict[str, Any]) -> str:
     """
     Generate a deterministic cache key from a request.
 
-    The cache key is a SHA256 hash of the normalized request in JSON format.
+    The cache key is a 128-bit xxh3 hash of the normalized request in JSON format.
+    The key only has to be stable and collision-free, not cryptographically strong,
+    so a non-cryptographic hash keeps keying cheap even for long prompts.
     All requests with the same input and sampling parameters (except `n`) will
     produce the same cache key.
 
@@ -73,16 +76,45 @@ def generate_cache_key(request_data: Dict[str, Any]) -> str:
         request_data: The request dictionary
 
     Returns:
-        A hex string representing the SHA256 hash of the normalized request
+        A 32-character hex string representing the xxh3-128 hash of the normalized request
     """
     normalized = normalize_request(request_data)
 
-    # Convert to JSON with sorted keys for determinism
-    json_str = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+    # Convert to compact JSON bytes with sorted keys for determinism
+    json_bytes = orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+    # Generate xxh3-128 hash
+    return xxhash.xxh3_128_hexdigest(json_bytes)
+
+
+def is_deterministic(request_data: Dict[str, Any]) -> bool:
+    """
+    Check whether a request is expected to produce the same output every time.
+
+    Greedy decoding (temperature 0) is deterministic, and so is sampling with a
+    fixed seed. A request without a temperature samples, since SGLang's default
+    temperature is 1.0.
+
+    Args:
+        request_data: The request dictionary (SGLang or OpenAI-compatible format)
+
+    Returns:
+        True if the request uses greedy decoding or a fixed seed
+    """
+    sampling_params = request_data.get("sampling_params")
+    if not isinstance(sampling_params, dict):
+        sampling_params = {}
 
-    # Generate SHA256 hash
-    hash_obj = hashlib.sha256(json_str.encode('utf-8'))
-    return hash_obj.hexdigest()
+    # OpenAI clients send "seed": null by default, which does not fix the sample
+    if (
+        sampling_params.get("sampling_seed") is not None
+        or sampling_params.get("seed") is not None
+        or request_data.get("seed") is not None
+    ):
+        return True
+
+    temperature = sampling_params.get("temperature", request_data.get("temperature", 1.0))
+    return temperature == 0
 
 
 def extract_n_parameter(request_data: Dict[str, Any]) -> int:
@@ -96,12 +128,9 @@ def extract_n_parameter(request_data: Dict[str, Any]) -> int:
         The value of `n` (defaults to 1 if not present)
     """
     # Check in sampling_params first
-    sampling_params = request_data.get("sampling_params", {})
+    sampling_params = request_data.get("sampling_params")
     if isinstance(sampling_params, dict) and "n" in sampling_params:
         return sampling_params["n"]
 
-    # Check at top level (OpenAI-compatible API)
-    if "n" in request_data:
-        return request_data["n"]
-
-    return 1  # Default value
+    # Fall back to top level (OpenAI-compatible API), defaulting to 1
+    return request_data.get("n", 1)
@@ -5,16 +5,61 @@ This module provides a FastAPI-based HTTP server that proxies requests to an
 underlying SGLang server while adding intelligent response caching.
 """
 
+import asyncio
+import itertools
 import sys
-from typing import Any, Dict, List, Optional, Union
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
 import httpx
+import orjson
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 
 from .cache_manager import CacheManager
-from .hashing import extract_n_parameter
+from .hashing import extract_n_parameter, is_deterministic
+
+# Response ids are a per-process counter; the start time keeps them distinct across restarts
+_ID_PREFIX = f"chatcmpl-{int(time.time())}"
+_ID_COUNTER = itertools.count()
+
+# Chat role -> prefix used when flattening messages into a prompt string
+_ROLE_PREFIXES = {
+    "system": "System: ",
+    "user": "User: ",
+    "assistant": "Assistant: ",
+}
+
+# OpenAI request parameter -> SGLang sampling parameter
+_PARAM_MAPPING = (
+    ("max_tokens", "max_new_tokens"),
+    ("temperature", "temperature"),
+    ("top_p", "top_p"),
+    ("n", "n"),
+    ("stop", "stop"),
+    ("presence_penalty", "presence_penalty"),
+    ("frequency_penalty", "frequency_penalty"),
+)
+
+
+def _next_response_id() -> str:
+    """Return a unique id for an OpenAI-format response."""
+    return f"{_ID_PREFIX}-{next(_ID_COUNTER)}"
+
+
+def _json_response(content: Any, cache_status: Optional[str] = None) -> Response:
+    """
+    Serialize a response body with orjson.
+
+    Returning the bytes directly skips FastAPI's jsonable_encoder walk and the
+    stdlib encoder, which matters for large multi-completion responses. When
+    `cache_status` is given it is reported in the X-Cache header.
+    """
+    headers = {"X-Cache": cache_status} if cache_status else None
+    return Response(content=orjson.dumps(content), media_type="application/json", headers=headers)
 
 
 def openai_to_sglang(openai_request: Dict[str, Any], is_chat: bool = False) -> Dict[str, Any]:
@@ -47,42 +92,26 @@ def openai_to_sglang(openai_request: Dict[str, Any], is_chat: bool = False) -> D
         # SGLang's /generate endpoint expects a string, not a messages array
         messages = openai_request.get("messages", [])
 
-        # Format messages into a conversational string
+        # Format messages into a conversational string, joined once at the end
         # This is a simple approach - a more sophisticated version would use the model's chat template
-        formatted_text = ""
+        parts = []
         for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "system":
-                formatted_text += f"System: {content}\n\n"
-            elif role == "user":
-                formatted_text += f"User: {content}\n\n"
-            elif role == "assistant":
-                formatted_text += f"Assistant: {content}\n\n"
+            prefix = _ROLE_PREFIXES.get(msg.get("role", "user"))
+            if prefix is not None:
+                parts.append(f"{prefix}{msg.get('content', '')}\n\n")
 
         # Add a prompt for the assistant to continue
         if messages and messages[-1].get("role") == "user":
-            formatted_text += "Assistant:"
+            parts.append("Assistant:")
 
-        sglang_request["text"] = formatted_text
+        sglang_request["text"] = "".join(parts)
     else:
         # Text completion - use prompt
         sglang_request["text"] = openai_request.get("prompt", "")
 
     # Map sampling parameters
     sampling_params = {}
-
-    param_mapping = {
-        "max_tokens": "max_new_tokens",
-        "temperature": "temperature",
-        "top_p": "top_p",
-        "n": "n",
-        "stop": "stop",
-        "presence_penalty": "presence_penalty",
-        "frequency_penalty": "frequency_penalty",
-    }
-
-    for openai_param, sglang_param in param_mapping.items():
+    for openai_param, sglang_param in _PARAM_MAPPING:
         if openai_param in openai_request:
             sampling_params[sglang_param] = openai_request[openai_param]
 
@@ -108,8 +137,6 @@ def sglang_to_openai(
     Returns:
         OpenAI-formatted response
     """
-    import time
-
     # Normalize to list
     if isinstance(sglang_response, dict):
         responses = [sglang_response]
@@ -137,7 +164,7 @@ def sglang_to_openai(
         choices.append(choice)
 
     return {
-        "id": f"chatcmpl-{int(time.time() * 1000)}",
+        "id": _next_response_id(),
         "object": "chat.completion" if is_chat else "text_completion",
         "created": int(time.time()),
         "model": model,
@@ -163,7 +190,11 @@ class CachedSGLangServer:
         sglang_url: str,
         cache_dir: Optional[str] = None,
         verbose: bool = True,
-        overwrite_cache: bool = False
+        overwrite_cache: bool = False,
+        cache_capacity: Optional[int] = None,
+        bypass_page_cache: bool = False,
+        cache_deterministic_only: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None
     ):
         """
         Initialize the cached server.
@@ -173,14 +204,44 @@ class CachedSGLangServer:
             cache_dir: Directory for cache storage (default: ~/.sglang_cache)
             verbose: Whether to print cache statistics
             overwrite_cache: Whether to remove existing cache and start fresh
+            cache_capacity: Maximum number of cache keys to keep (default: unbounded)
+            bypass_page_cache: Whether to keep the cache file out of the OS page cache
+            cache_deterministic_only: Whether to only cache requests with temperature 0
+                or a fixed seed, forwarding sampled requests without caching them
+            transport: httpx transport for requests to SGLang (default: a pooled
+                network connection), e.g. a mock transport in tests
         """
         self.sglang_url = sglang_url.rstrip('/')
-        self.cache = CacheManager(cache_dir, overwrite=overwrite_cache)
+        self.cache = CacheManager(
+            cache_dir,
+            overwrite=overwrite_cache,
+            capacity=cache_capacity,
+            bypass_page_cache=bypass_page_cache
+        )
         self.verbose = verbose
-        self.app = FastAPI(title="SGLang Cached Wrapper")
-
-        # Create async HTTP client for forwarding requests
-        self.http_client = httpx.AsyncClient(timeout=300.0)
+        self.cache_deterministic_only = cache_deterministic_only
+
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            yield
+            # Flush pending cache writes and close pooled connections on exit
+            await self.shutdown()
+
+        self.app = FastAPI(title="SGLang Cached Wrapper", lifespan=lifespan)
+
+        # cache_key -> (future resolved when the fetch ends, responses requested)
+        # for every SGLang request currently in flight for that key
+        self._inflight: Dict[str, List[Tuple[asyncio.Future, int]]] = {}
+
+        # Create async HTTP client for forwarding requests. Keep enough idle
+        # connections alive that bursts of cache misses reuse them instead of
+        # reconnecting (httpx keeps only 20 by default)
+        self.http_client = httpx.AsyncClient(
+            base_url=self.sglang_url,
+            timeout=300.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=64),
+            transport=transport
+        )
 
         # Register routes
         self._setup_routes()
@@ -201,7 +262,7 @@ class CachedSGLangServer:
             Forwards requests to underlying SGLang server, using cache when possible.
             Requires a 'model' field in the request for proper caching.
             """
-            request_data = await request.json()
+            request_data = orjson.loads(await request.body())
 
             # Validate that model is present
             if "model" not in request_data:
@@ -210,7 +271,12 @@ class CachedSGLangServer:
                     detail="The 'model' field is required in all requests"
                 )
 
-            return await self._handle_generate(request_data)
+            # Streamed responses are passed through uncached
+            if request_data.get("stream"):
+                payload = {k: v for k, v in request_data.items() if k != "model"}
+                return await self._stream_upstream("/generate", payload)
+
+            return _json_response(*await self._handle_generate(request_data))
 
         @self.app.get("/cache/stats")
         async def cache_stats():
@@ -223,6 +289,19 @@ class CachedSGLangServer:
             self.cache.clear()
             return {"status": "success", "message": "Cache cleared"}
 
+        @self.app.post("/cache/flush")
+        def cache_flush():
+            """Wait until all queued cache writes are on disk."""
+            if not self.cache.flush(timeout=10.0):
+                raise HTTPException(status_code=503, detail="Timed out flushing cache writes")
+            return {"status": "success", "message": "Cache flushed"}
+
+        @self.app.post("/cache/reset_stats")
+        async def cache_reset_stats():
+            """Reset hit/miss statistics without clearing cached responses."""
+            self.cache.reset_stats()
+            return {"status": "success", "message": "Cache statistics reset"}
+
         @self.app.get("/cache/info")
         async def cache_info():
             """Get detailed cache information."""
@@ -234,6 +313,7 @@ class CachedSGLangServer:
                 "hits": stats["hits"],
                 "misses": stats["misses"],
                 "hit_rate": stats["hit_rate"],
+                "cache_bypassed": stats["cache_bypassed"],
                 "pending_writes": stats["pending_writes"]
             }
 
@@ -244,19 +324,23 @@ class CachedSGLangServer:
 
             Converts OpenAI format to SGLang, processes with caching, and converts back.
             """
-            openai_request = await request.json()
+            openai_request = orjson.loads(await request.body())
 
-            # Transform to SGLang format
+            # Transform to SGLang format (also validates the model field)
             sglang_request = openai_to_sglang(openai_request, is_chat=False)
 
+            # Streamed responses are passed through uncached
+            if openai_request.get("stream"):
+                return await self._stream_upstream("/v1/completions", openai_request)
+
             # Process with caching
-            sglang_response = await self._handle_generate(sglang_request)
+            sglang_response, cache_status = await self._handle_generate(sglang_request)
 
             # Transform back to OpenAI format
             model = openai_request.get("model", "sglang")
             openai_response = sglang_to_openai(sglang_response, is_chat=False, model=model)
 
-            return openai_response
+            return _json_response(openai_response, cache_status)
 
         @self.app.post("/v1/chat/completions")
         async def openai_chat_completions(request: Request):
@@ -265,87 +349,224 @@ class CachedSGLangServer:
 
             Forwards directly to SGLang's /v1/chat/completions endpoint to avoid conversion issues.
             """
-            openai_request = await request.json()
+            openai_request = orjson.loads(await request.body())
 
             # Use the OpenAI request directly as the cache key
             # We need to convert it to a format compatible with our cache hashing
             sglang_request = openai_to_sglang(openai_request, is_chat=True)
 
+            # Streamed responses are passed through uncached
+            if openai_request.get("stream"):
+                return await self._stream_upstream("/v1/chat/completions", openai_request)
+
             # Process with caching, but use chat completions endpoint
-            sglang_response = await self._handle_chat_completions(openai_request, sglang_request)
+            return _json_response(*await self._handle_chat_completions(openai_request, sglang_request))
 
-            return sglang_response
+    def _bypasses_cache(self, request_data: Dict[str, Any]) -> bool:
+        """
+        Check whether a request should skip the cache entirely.
 
-    async def _handle_generate(self, request_data: Dict[str, Any]) -> Union[Dict, List[Dict]]:
+        With `cache_deterministic_only`, sampled requests are neither looked up
+        nor stored, since a cached sample would be replayed as if it were the
+        only possible answer. Bypasses are counted in the cache stats.
         """
-        Handle a generate request with caching logic.
+        if not self.cache_deterministic_only or is_deterministic(request_data):
+            return False
+        self.cache.record_bypass()
+        if self.verbose:
+            print("[Cache bypass] Sampled request without a seed")
+        return True
+
+    async def _get_or_fetch(
+        self,
+        cache_key: str,
+        n: int,
+        fetch: Callable[[int], Awaitable[List[Dict]]]
+    ) -> Tuple[Tuple[Dict, ...], List[Dict], str]:
+        """
+        Get `n` responses for a cache key, fetching only the missing ones.
+
+        Concurrent misses on the same key are merged: responses already being
+        fetched by other requests count towards this request, so it only fetches
+        the shortfall (concurrently with them) and then re-reads the cache once
+        the fetches it relied on have finished. Identical concurrent requests
+        therefore cost a single upstream call.
 
         Args:
-            request_data: Request dictionary for SGLang
+            cache_key: Cache key from `CacheManager.resolve`
+            n: Number of responses requested
+            fetch: Coroutine function fetching the given number of new responses
 
         Returns:
-            Response from cache or SGLang (dict if n=1, list if n>1)
+            Tuple of (cached_responses, new_responses, cache_status), where
+            cache_status is "HIT", "PARTIAL" or "MISS" for the initial lookup
         """
-        n = extract_n_parameter(request_data)
-
         # Check cache (fast, returns immediately)
-        cached_responses, num_needed = self.cache.get(request_data)
+        cached_responses, num_needed = self.cache.get_by_key(cache_key, n=n)
+        num_cached = len(cached_responses)
+        cache_status = "HIT" if num_needed == 0 else "PARTIAL" if num_cached > 0 else "MISS"
 
         if self.verbose:
-            num_cached = len(cached_responses)
-            cache_status = "hit" if num_needed == 0 else "partial" if num_cached > 0 else "miss"
-            print(f"[Cache {cache_status}] Cached: {num_cached}/{n}, Need: {num_needed}")
-
-        # If we need more responses, call SGLang asynchronously
-        new_responses = []
-        if num_needed > 0:
-            # Create modified request for SGLang
-            sglang_request = request_data.copy()
-
-            # Remove model field (used for caching only, not for SGLang API)
-            sglang_request.pop("model", None)
-
-            # Update n parameter in the request
-            if "sampling_params" in sglang_request:
-                sglang_request["sampling_params"] = sglang_request["sampling_params"].copy()
-                sglang_request["sampling_params"]["n"] = num_needed
-            else:
-                sglang_request["sampling_params"] = {"n": num_needed}
-
-            # Call SGLang asynchronously
-            try:
-                response = await self.http_client.post(
-                    f"{self.sglang_url}/generate",
-                    json=sglang_request
-                )
-                response.raise_for_status()
-                result = response.json()
+            print(f"[Cache {cache_status.lower()}] Cached: {num_cached}/{n}, Need: {num_needed}")
+
+        new_responses: List[Dict] = []
+        while num_needed > 0:
+            in_flight = self._inflight.setdefault(cache_key, [])
+            awaited = list(in_flight)
+            shortfall = num_needed - sum(count for _, count in awaited)
+
+            if shortfall > 0:
+                entry = (asyncio.get_running_loop().create_future(), shortfall)
+                in_flight.append(entry)
+                try:
+                    new_responses = await fetch(shortfall)
+                    # Update cache asynchronously
+                    self.cache.put_by_key(cache_key, new_responses)
+                finally:
+                    # Wake waiters even on failure, they retry the fetch themselves
+                    in_flight.remove(entry)
+                    if not in_flight:
+                        del self._inflight[cache_key]
+                    entry[0].set_result(None)
+
+            if not awaited:
+                break
+
+            # Shielded so a cancelled waiter does not cancel the shared futures
+            await asyncio.shield(asyncio.gather(*(future for future, _ in awaited)))
+            cached_responses, num_needed = self.cache.get_by_key(cache_key, n=n, record_stats=False)
+            new_responses = []
+
+        return cached_responses, new_responses, cache_status
+
+    async def _handle_generate(
+        self,
+        request_data: Dict[str, Any]
+    ) -> Tuple[Union[Dict, List[Dict]], str]:
+        """
+        Handle a generate request with caching logic.
 
-                # Handle both dict (n=1) and list (n>1) responses
-                if isinstance(result, dict):
-                    new_responses = [result]
-                else:
-                    new_responses = result
+        Args:
+            request_data: Request dictionary for SGLang
 
-                # Update cache asynchronously with original request
-                self.cache.put(request_data, new_responses)
+        Returns:
+            Tuple of (response, cache_status). The response is from cache or
+            SGLang (dict if n=1, list if n>1); cache_status is "HIT", "PARTIAL",
+            "MISS" or "BYPASS"
+        """
+        if self._bypasses_cache(request_data):
+            n = extract_n_parameter(request_data)
+            cached_responses, new_responses = (), await self._fetch_generate(request_data, n)
+            cache_status = "BYPASS"
+        else:
+            # Hash the request once and reuse the key for both lookup and update
+            cache_key, n = self.cache.resolve(request_data)
 
-            except httpx.HTTPError as e:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Failed to connect to SGLang server at {self.sglang_url}: {str(e)}"
-                )
+            cached_responses, new_responses, cache_status = await self._get_or_fetch(
+                cache_key, n, lambda num_needed: self._fetch_generate(request_data, num_needed)
+            )
 
         # Merge cached and new responses
-        all_responses = cached_responses + new_responses
+        all_responses = [*cached_responses, *new_responses]
 
         # Return in the same format SGLang would (dict if n=1, list otherwise)
         if n == 1:
-            return all_responses[0]
+            return all_responses[0], cache_status
         else:
-            return all_responses
+            return all_responses, cache_status
+
+    async def _post_upstream(self, path: str, payload: Dict[str, Any]) -> Any:
+        """
+        POST a JSON payload to SGLang and return the parsed response.
+
+        The body is serialized with orjson up front and sent as raw content,
+        instead of letting httpx encode it with the stdlib json module.
+
+        Raises:
+            HTTPException: 502 if SGLang cannot be reached or returns an error
+        """
+        try:
+            response = await self.http_client.post(
+                path,
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Failed to connect to SGLang server at {self.sglang_url}: {str(e)}"
+            )
+        return orjson.loads(response.content)
+
+    async def _stream_upstream(self, path: str, payload: Dict[str, Any]) -> StreamingResponse:
+        """
+        POST a streaming request to SGLang and relay its body as it arrives.
+
+        Streamed responses are not cached: they are forwarded chunk by chunk
+        rather than buffered, so the client sees the first tokens immediately.
+        The body is relayed decoded, since SGLang's Content-Encoding header is
+        not passed on.
+
+        Raises:
+            HTTPException: 502 if SGLang cannot be reached or returns an error
+        """
+        if self.verbose:
+            print(f"[Cache bypass] Streaming {path}")
+
+        upstream_request = self.http_client.build_request(
+            "POST",
+            path,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            response = await self.http_client.send(upstream_request, stream=True)
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Failed to connect to SGLang server at {self.sglang_url}: {str(e)}"
+            )
+        if response.is_error:
+            await response.aclose()
+            raise HTTPException(
+                status_code=502,
+                detail=f"SGLang server at {self.sglang_url} returned status {response.status_code}"
+            )
+
+        return StreamingResponse(
+            response.aiter_bytes(),
+            media_type=response.headers.get("content-type"),
+            headers={"X-Cache": "BYPASS"},
+            background=BackgroundTask(response.aclose)
+        )
 
-    async def _handle_chat_completions(self, openai_request: Dict[str, Any], cache_key_request: Dict[str, Any]) -> Dict[str, Any]:
+    async def _fetch_generate(self, request_data: Dict[str, Any], num_needed: int) -> List[Dict]:
+        """Request `num_needed` new responses from SGLang's /generate endpoint."""
+        # Create modified request for SGLang in one pass, dropping the model
+        # field (used for caching only, not for SGLang API). Every other field
+        # is forwarded, since SGLang accepts more than text and input_ids
+        sglang_request = {k: v for k, v in request_data.items() if k != "model"}
+
+        # Update n parameter in the request
+        sglang_request["sampling_params"] = {
+            **(request_data.get("sampling_params") or {}),
+            "n": num_needed
+        }
+
+        # Call SGLang asynchronously
+        result = await self._post_upstream("/generate", sglang_request)
+
+        # Handle both dict (n=1) and list (n>1) responses
+        if isinstance(result, dict):
+            return [result]
+        return result
+
+    async def _handle_chat_completions(
+        self,
+        openai_request: Dict[str, Any],
+        cache_key_request: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], str]:
         """
         Handle a chat completions request with caching logic.
         Forwards to SGLang's /v1/chat/completions endpoint directly.
@@ -355,55 +576,22 @@ class CachedSGLangServer:
             cache_key_request: Converted request for cache key generation
 
         Returns:
-            OpenAI-formatted chat completion response
+            Tuple of (OpenAI-formatted chat completion response, cache_status)
         """
         n = openai_request.get("n", 1)
 
-        # Check cache using the cache_key_request (fast, returns immediately)
-        cached_responses, num_needed = self.cache.get(cache_key_request)
-
-        if self.verbose:
-            num_cached = len(cached_responses)
-            cache_status = "hit" if num_needed == 0 else "partial" if num_cached > 0 else "miss"
-            print(f"[Cache {cache_status}] Cached: {num_cached}/{n}, Need: {num_needed}")
-
-        # If we need more responses, call SGLang's chat completions endpoint asynchronously
-        new_responses = []
-        if num_needed > 0:
-            # Create modified request for SGLang
-            sglang_request = openai_request.copy()
-            sglang_request["n"] = num_needed
-
-            # Call SGLang's /v1/chat/completions endpoint asynchronously
-            try:
-                response = await self.http_client.post(
-                    f"{self.sglang_url}/v1/chat/completions",
-                    json=sglang_request
-                )
-                response.raise_for_status()
-                result = response.json()
-
-                # Extract choices from OpenAI response format
-                # We need to store individual responses for caching
-                if "choices" in result:
-                    for choice in result["choices"]:
-                        # Store each choice as a separate response for caching
-                        # Convert to the format expected by cache (similar to SGLang /generate format)
-                        if "message" in choice and "content" in choice["message"]:
-                            new_responses.append({"text": choice["message"]["content"]})
-
-                # Update cache asynchronously with original request
-                if new_responses:
-                    self.cache.put(cache_key_request, new_responses)
-
-            except httpx.HTTPError as e:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Failed to connect to SGLang server at {self.sglang_url}: {str(e)}"
-                )
+        # Check cache using the cache_key_request
+        if self._bypasses_cache(openai_request):
+            cached_responses, new_responses = (), await self._fetch_chat(openai_request, n)
+            cache_status = "BYPASS"
+        else:
+            cache_key, cache_n = self.cache.resolve(cache_key_request)
+            cached_responses, new_responses, cache_status = await self._get_or_fetch(
+                cache_key, cache_n, lambda num_needed: self._fetch_chat(openai_request, num_needed)
+            )
 
         # Merge cached and new responses
-        all_responses = cached_responses + new_responses
+        all_responses = [*cached_responses, *new_responses]
 
         # Convert cached responses back to OpenAI chat format
         choices = []
@@ -419,10 +607,10 @@ class CachedSGLangServer:
             choices.append(choice)
 
         # Return in OpenAI chat completion format
-        return {
-            "id": f"chatcmpl-{hash(str(openai_request))}",
+        response = {
+            "id": _next_response_id(),
             "object": "chat.completion",
-            "created": int(__import__('time').time()),
+            "created": int(time.time()),
             "model": openai_request.get("model", "sglang"),
             "choices": choices,
             "usage": {
@@ -431,16 +619,43 @@ class CachedSGLangServer:
                 "total_tokens": 0
             }
         }
+        return response, cache_status
+
+    async def _fetch_chat(self, openai_request: Dict[str, Any], num_needed: int) -> List[Dict]:
+        """Request `num_needed` new responses from SGLang's /v1/chat/completions endpoint."""
+        # Create modified request for SGLang
+        sglang_request = openai_request.copy()
+        sglang_request["n"] = num_needed
+
+        # Call SGLang's /v1/chat/completions endpoint asynchronously
+        result = await self._post_upstream("/v1/chat/completions", sglang_request)
+
+        # Extract choices from OpenAI response format
+        # We need to store individual responses for caching
+        new_responses = []
+        for choice in result.get("choices", []):
+            # Store each choice as a separate response for caching
+            # Convert to the format expected by cache (similar to SGLang /generate format)
+            if "message" in choice and "content" in choice["message"]:
+                new_responses.append({"text": choice["message"]["content"]})
+        return new_responses
 
     def run(self, host: str = "0.0.0.0", port: int = 30001):
         """
         Run the FastAPI server.
 
+        uvicorn picks uvloop and httptools when they are installed (they come
+        with uvicorn[standard]). Per-request access logs follow `verbose`.
+
         Args:
             host: Host to bind to
             port: Port to bind to
         """
-        uvicorn.run(self.app, host=host, port=port)
+        uvicorn.run(self.app, host=host, port=port, access_log=self.verbose)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until all queued cache writes are on disk."""
+        return self.cache.flush(timeout)
 
     async def shutdown(self):
         """Shutdown the cache manager and HTTP client."""
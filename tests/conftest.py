@@ -0,0 +1,104 @@
+"""
+Shared pytest fixtures.
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+SGLANG_URL = "http://127.0.0.1:30000"
+WRAPPER_URL = "http://127.0.0.1:30001"
+
+# Keep test caches on tmpfs where available, so they never touch the disk
+TMPFS_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
+
+def _is_healthy(http, url):
+    """Check whether a server answers its /health endpoint."""
+    try:
+        response = http.get(f"{url}/health", timeout=2)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip every test that needs the wrapper server with a single probe when it is down."""
+    wrapper_items = [item for item in items if "clean_cache_class" in item.fixturenames]
+    if not wrapper_items:
+        return
+
+    with requests.Session() as session:
+        if _is_healthy(session, WRAPPER_URL):
+            return
+
+    skip = pytest.mark.skip(reason="Wrapper server not running")
+    for item in wrapper_items:
+        item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def http():
+    """Shared HTTP session so tests reuse pooled keep-alive connections."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def sglang_url():
+    """SGLang server URL."""
+    return SGLANG_URL
+
+
+@pytest.fixture(scope="session")
+def wrapper_url():
+    """Wrapper server URL."""
+    return WRAPPER_URL
+
+
+@pytest.fixture(scope="session")
+def is_sglang_running(http, sglang_url):
+    """Check if SGLang server is running."""
+    return _is_healthy(http, sglang_url)
+
+
+@pytest.fixture(scope="session")
+def warm_wrapper(http, wrapper_url):
+    """Send one tiny generation so SGLang's cold start is not timed inside a test."""
+    http.post(
+        f"{wrapper_url}/generate",
+        json={
+            "text": "warmup",
+            "model": "test-model",
+            "sampling_params": {"max_new_tokens": 1, "temperature": 0.0}
+        },
+        timeout=60
+    )
+
+
+@pytest.fixture(scope="class")
+def clean_cache_class(http, wrapper_url, warm_wrapper):
+    """Clear cache once per test class (tests using it are skipped when the wrapper is down)."""
+    # xdist workers share one wrapper, so a clear here would race other workers
+    if "PYTEST_XDIST_WORKER" not in os.environ:
+        http.post(f"{wrapper_url}/cache/clear")
+
+
+@pytest.fixture(scope="function")
+def clear_cache(http, wrapper_url):
+    """Clear cache before a test that asserts on the number of keys."""
+    http.post(f"{wrapper_url}/cache/clear")
+
+
+@pytest.fixture
+def temp_cache_dir():
+    """Create a temporary cache directory."""
+    temp_dir = tempfile.mkdtemp(dir=TMPFS_DIR)
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
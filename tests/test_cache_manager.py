@@ -2,20 +2,12 @@
 Unit tests for CacheManager.
 """
 
+import threading
+
 import pytest
-import tempfile
-import shutil
 from pathlib import Path
 
-from sglang_cached.cache_manager import CacheManager
-
-
-@pytest.fixture
-def temp_cache_dir():
-    """Create a temporary cache directory."""
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    shutil.rmtree(temp_dir, ignore_errors=True)
+from sglang_cached.cache_manager import CACHE_FILE_NAME, CacheManager
 
 
 @pytest.fixture
@@ -39,7 +31,7 @@ class TestCacheBasics:
 
         cached, needed = cache_manager.get(request)
 
-        assert cached == []
+        assert cached == ()
         assert needed == 1
 
     def test_full_cache_hit(self, cache_manager):
@@ -87,6 +79,23 @@ class TestCacheBasics:
         assert len(cached) == 2
         assert needed == 3
 
+    def test_resolved_key_matches_request(self, cache_manager):
+        """Test that get_by_key/put_by_key share entries with get/put."""
+        request = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 2}}
+
+        cache_key, n = cache_manager.resolve(request)
+        assert n == 2
+
+        cache_manager.put_by_key(cache_key, [{"text": "r1"}])
+        cached, needed = cache_manager.get(request)
+        assert [r["text"] for r in cached] == ["r1"]
+        assert needed == 1
+
+        cache_manager.put(request, [{"text": "r2"}])
+        cached, needed = cache_manager.get_by_key(cache_key, n=n)
+        assert [r["text"] for r in cached] == ["r1", "r2"]
+        assert needed == 0
+
 
 class TestNParameterLogic:
     """Test the n parameter logic."""
@@ -172,14 +181,9 @@ class TestPersistence:
         }
         responses = [{"text": "response", "meta_info": {"id": "1"}}]
 
-        # Create cache, add data, shutdown
-        cache1 = CacheManager(cache_dir=temp_cache_dir)
-        cache1.put(request, responses)
-        cache1.shutdown()
-
-        # Wait a bit for async write
-        import time
-        time.sleep(0.5)
+        # Create cache and add data; leaving the block shuts it down
+        with CacheManager(cache_dir=temp_cache_dir) as cache1:
+            cache1.put(request, responses)
 
         # Create new cache manager, should load from disk
         cache2 = CacheManager(cache_dir=temp_cache_dir)
@@ -191,6 +195,168 @@ class TestPersistence:
 
         cache2.shutdown()
 
+    def test_flush_writes_queued_entries(self, cache_manager):
+        """Test that flush() returns once queued puts are in the cache file."""
+        request = {"text": "Flush test", "model": "test-model", "sampling_params": {"n": 1}}
+        cache_key, _ = cache_manager.resolve(request)
+
+        cache_manager.put(request, [{"text": "response"}])
+
+        assert cache_manager.flush(timeout=2.0)
+        assert cache_manager.get_stats()["pending_writes"] == 0
+        assert cache_key in cache_manager.cache_file.read_text()
+
+    def test_flush_barrier_requeued_by_final_compaction_is_released(self, temp_cache_dir):
+        """Test that a flush() barrier requeued by compaction at shutdown is still set."""
+        cache = CacheManager(cache_dir=temp_cache_dir, capacity=1)
+        cache._shard_index = lambda cache_key: 0
+        request_a = {"text": "a", "model": "test-model", "sampling_params": {"n": 1}}
+        request_b = {"text": "b", "model": "test-model", "sampling_params": {"n": 2}}
+        cache.put(request_a, [{"text": "x"}])
+        cache.shutdown()
+
+        # Queue an eviction that triggers compaction, then run only the final drain
+        cache.put(request_b, [{"text": "r1"}, {"text": "r2"}])
+        barrier = threading.Event()
+        compact = cache._compact
+
+        def compact_with_concurrent_flush():
+            cache._write_deque.append(barrier)
+            compact()
+
+        cache._compact = compact_with_concurrent_flush
+        cache._writer_loop()
+
+        assert barrier.is_set()
+
+    def test_appended_entries_reload(self, temp_cache_dir):
+        """Test that repeated puts to one key are appended and reload in order."""
+        request = {
+            "text": "Append test",
+            "model": "test-model",
+            "sampling_params": {"temperature": 0.8, "n": 3}
+        }
+
+        cache1 = CacheManager(cache_dir=temp_cache_dir)
+        for i in range(3):
+            cache1.put(request, [{"text": f"r{i}", "meta_info": {}}])
+        cache1.shutdown()
+
+        # The log never holds more than twice the live data
+        lines = cache1.cache_file.read_text().splitlines()
+        assert 1 <= len(lines) <= 3
+
+        cache2 = CacheManager(cache_dir=temp_cache_dir)
+        cached, needed = cache2.get(request)
+
+        assert [r["text"] for r in cached] == ["r0", "r1", "r2"]
+        assert needed == 0
+
+        cache2.shutdown()
+
+    def test_compaction_with_queued_put(self, temp_cache_dir):
+        """Test that a put queued during compaction is not written twice."""
+        cache = CacheManager(cache_dir=temp_cache_dir, capacity=1)
+        cache._shard_index = lambda cache_key: 0
+        request_a = {"text": "a", "model": "test-model", "sampling_params": {"n": 1}}
+        request_b = {"text": "b", "model": "test-model", "sampling_params": {"n": 3}}
+
+        # Queue a put for "b" from inside the writer's first compaction
+        compact = cache._compact
+
+        def compact_with_queued_put():
+            cache._compact = compact
+            cache.put(request_b, [{"text": "r3"}])
+            compact()
+
+        cache._compact = compact_with_queued_put
+
+        cache.put(request_a, [{"text": "x"}])
+        assert cache.flush(timeout=2.0)
+        # Evicting "a" leaves the log mostly dead, which triggers compaction
+        cache.put(request_b, [{"text": "r1"}, {"text": "r2"}])
+        assert cache.flush(timeout=2.0)
+        assert cache._compact is compact
+
+        in_memory = [r["text"] for r in cache.get(request_b, n=10)[0]]
+        cache.shutdown()
+
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert [r["text"] for r in reloaded.get(request_b, n=10)[0]] == in_memory == ["r1", "r2", "r3"]
+        reloaded.shutdown()
+
+    def test_torn_last_record_does_not_lose_later_puts(self, temp_cache_dir):
+        """Test that puts made after loading a torn log survive a reload."""
+        cache = CacheManager(cache_dir=temp_cache_dir)
+        request_a = {"text": "a", "model": "test-model", "sampling_params": {"n": 1}}
+        cache.put(request_a, [{"text": "r1"}])
+        cache.shutdown()
+
+        # Simulate a crash partway through appending a record
+        cache_file = Path(temp_cache_dir) / CACHE_FILE_NAME
+        with open(cache_file, 'ab') as f:
+            f.write(b'{"cache_key": "torn", "delta": [{"te')
+
+        cache = CacheManager(cache_dir=temp_cache_dir)
+        request_b = {"text": "b", "model": "test-model", "sampling_params": {"n": 1}}
+        request_c = {"text": "c", "model": "test-model", "sampling_params": {"n": 1}}
+        cache.put(request_b, [{"text": "r2"}])
+        assert cache.flush(timeout=2.0)
+        cache.put(request_c, [{"text": "r3"}])
+        cache.shutdown()
+
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert reloaded.get(request_a)[0] == ({"text": "r1"},)
+        assert reloaded.get(request_b)[0] == ({"text": "r2"},)
+        assert reloaded.get(request_c)[0] == ({"text": "r3"},)
+        reloaded.shutdown()
+
+    def test_corrupt_record_is_skipped(self, temp_cache_dir):
+        """Test that records after an unparsable or malformed line are still loaded."""
+        cache_file = Path(temp_cache_dir) / CACHE_FILE_NAME
+        cache_file.write_bytes(
+            b'{"cache_key": "k1", "responses": [{"text": "r1"}]}\n'
+            b'not json\n'
+            b'[]\n'
+            b'{}\n'
+            b'{"cache_key": "k3"}\n'
+            b'{"cache_key": "k2", "responses": [{"text": "r2"}]}\n'
+        )
+
+        cache = CacheManager(cache_dir=temp_cache_dir)
+        assert cache.get_by_key("k1", n=1)[0] == ({"text": "r1"},)
+        assert cache.get_by_key("k2", n=1)[0] == ({"text": "r2"},)
+        cache.shutdown()
+
+    def test_clear_drops_queued_writes(self, temp_cache_dir):
+        """Test that writes queued before clear() do not come back on reload."""
+        cache = CacheManager(cache_dir=temp_cache_dir)
+        for i in range(200):
+            request = {"text": f"prompt {i}", "model": "test-model", "sampling_params": {"n": 1}}
+            cache.put(request, [{"text": f"r{i}"}])
+        cache.clear()
+        cache.shutdown()
+
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert reloaded.get_stats()["num_keys"] == 0
+        reloaded.shutdown()
+
+    def test_load_full_and_delta_records(self, temp_cache_dir):
+        """Test that full-list records replace and delta records extend on load."""
+        import json
+
+        cache_file = Path(temp_cache_dir) / CACHE_FILE_NAME
+        with open(cache_file, 'w') as f:
+            f.write(json.dumps({"cache_key": "k", "responses": [{"text": "old"}]}) + '\n')
+            f.write(json.dumps({"cache_key": "k", "responses": [{"text": "r1"}]}) + '\n')
+            f.write(json.dumps({"cache_key": "k", "delta": [{"text": "r2"}]}) + '\n')
+
+        cache = CacheManager(cache_dir=temp_cache_dir)
+
+        assert cache._shards[cache._shard_index("k")]["k"] == [{"text": "r1"}, {"text": "r2"}]
+
+        cache.shutdown()
+
 
 class TestStats:
     """Test cache statistics."""
@@ -240,3 +406,100 @@ class TestStats:
 
         stats = cache_manager.get_stats()
         assert stats["num_keys"] == 0
+
+    def test_reset_stats_keeps_entries(self, cache_manager):
+        """Test that resetting stats zeroes counters but keeps cached responses."""
+        request = {"text": "Test", "model": "test-model", "sampling_params": {"n": 1}}
+        cache_manager.get(request)
+        cache_manager.put(request, [{"text": "r", "meta_info": {}}])
+
+        cache_manager.reset_stats()
+
+        stats = cache_manager.get_stats()
+        assert (stats["hits"], stats["misses"]) == (0, 0)
+        assert stats["num_keys"] == 1
+        assert cache_manager.get(request)[1] == 0
+
+    def test_total_responses_tracking(self, temp_cache_dir):
+        """Test that total_responses follows puts, evictions, reloads and clears."""
+        cache = CacheManager(cache_dir=temp_cache_dir, capacity=1)
+        cache._shard_index = lambda cache_key: 0
+        request_a = {"text": "a", "model": "test-model", "sampling_params": {"n": 1}}
+        request_b = {"text": "b", "model": "test-model", "sampling_params": {"n": 1}}
+
+        cache.put(request_a, [{"text": "r1"}, {"text": "r2"}])
+        cache.put(request_a, [{"text": "r3"}])
+        assert cache.get_stats()["total_responses"] == 3
+
+        # Evicting "a" drops its responses from the total
+        cache.put(request_b, [{"text": "r4"}])
+        assert cache.get_stats()["total_responses"] == 1
+        cache.shutdown()
+
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert reloaded.get_stats()["total_responses"] == 1
+        reloaded.clear()
+        assert reloaded.get_stats()["total_responses"] == 0
+        reloaded.shutdown()
+
+
+class TestCapacity:
+    """Test LRU eviction when a capacity is set."""
+
+    def test_evicts_least_recently_used(self, temp_cache_dir):
+        """Test that the least recently used key is evicted once over capacity."""
+        cache = CacheManager(cache_dir=temp_cache_dir, capacity=2)
+        requests_by_text = {
+            text: {"text": text, "model": "test-model", "sampling_params": {"n": 1}}
+            for text in ("a", "b", "c")
+        }
+
+        # Force every key into the same shard so eviction is exact
+        cache._shard_index = lambda cache_key: 0
+
+        cache.put(requests_by_text["a"], [{"text": "ra"}])
+        cache.put(requests_by_text["b"], [{"text": "rb"}])
+        cache.get(requests_by_text["a"])  # "a" is now most recently used
+        cache.put(requests_by_text["c"], [{"text": "rc"}])
+
+        assert cache.get_stats()["num_keys"] == 2
+        assert cache.get(requests_by_text["a"])[1] == 0
+        assert cache.get(requests_by_text["b"])[1] == 1
+        assert cache.get(requests_by_text["c"])[1] == 0
+        cache.shutdown()
+
+        # Evictions are persisted, so the evicted key stays gone after reload
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert reloaded.get_stats()["num_keys"] == 2
+        assert reloaded.get(requests_by_text["b"])[1] == 1
+        reloaded.shutdown()
+
+    @pytest.mark.parametrize("capacity", [0, -1])
+    def test_rejects_capacity_below_one(self, temp_cache_dir, capacity):
+        """Test that a capacity that would evict every put is rejected."""
+        with pytest.raises(ValueError):
+            CacheManager(cache_dir=temp_cache_dir, capacity=capacity)
+
+    def test_capacity_holds_across_shards(self, temp_cache_dir):
+        """Test that keys spread across shards never exceed the capacity."""
+        cache = CacheManager(cache_dir=temp_cache_dir, capacity=4)
+        requests = [
+            {"text": f"prompt {i}", "model": "test-model", "sampling_params": {"n": 1}}
+            for i in range(40)
+        ]
+        shards = {cache._shard_index(cache.resolve(request)[0]) for request in requests}
+        assert len(shards) > 4
+
+        for i, request in enumerate(requests):
+            cache.put(request, [{"text": f"r{i}"}])
+            assert cache.get_stats()["num_keys"] <= 4
+
+        assert cache.get_stats()["num_keys"] == 4
+        assert cache.get_stats()["total_responses"] == 4
+        assert cache.get(requests[-1])[0] == ({"text": "r39"},)
+        cache.shutdown()
+
+        reloaded = CacheManager(cache_dir=temp_cache_dir)
+        assert reloaded.get_stats()["num_keys"] == 4
+        assert reloaded.get(requests[-1])[0] == ({"text": "r39"},)
+        reloaded.shutdown()
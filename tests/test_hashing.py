@@ -6,7 +6,8 @@ import pytest
 from sglang_cached.hashing import (
     normalize_request,
     generate_cache_key,
-    extract_n_parameter
+    extract_n_parameter,
+    is_deterministic
 )
 
 
@@ -66,6 +67,26 @@ class TestNormalization:
         assert "temperature" in normalized["sampling_params"]
         assert "max_new_tokens" in normalized["sampling_params"]
 
+    def test_normalize_does_not_modify_original(self):
+        """Test that normalization leaves the caller's request untouched."""
+        request = {
+            "text": "Test",
+            "model": "test-model",
+            "n": 2,
+            "sampling_params": {"temperature": 0.5, "n": 10}
+        }
+        normalize_request(request)
+
+        assert request["n"] == 2
+        assert request["sampling_params"] == {"temperature": 0.5, "n": 10}
+
+    def test_empty_sampling_params_are_dropped(self):
+        """Test that empty sampling_params, or ones holding only n, match none at all."""
+        base = {"text": "Test", "model": "test-model"}
+
+        assert normalize_request({**base, "sampling_params": {}}) == base
+        assert normalize_request({**base, "sampling_params": {"n": 3}}) == base
+
     def test_normalize_includes_model(self):
         """Test that model parameter is included in normalized request."""
         request = {
@@ -194,13 +215,29 @@ class TestCacheKey:
         # All keys should be identical
         assert len(set(keys)) == 1
 
+    def test_key_is_stable_across_releases(self):
+        """Cache key for a fixed request must not change, or existing cache files go stale."""
+        request = {
+            "text": "Hello, wörld",
+            "model": "test-model",
+            "sampling_params": {
+                "temperature": 0.5,
+                "max_new_tokens": 1e3,
+                "n": 4,
+                "stop": ["\n"]
+            }
+        }
+
+        # Covers key order, non-ASCII text, float formatting and escapes
+        assert generate_cache_key(request) == "7dcc282b702838aceb055e849bdd8d2a"
+
     def test_key_is_hex_string(self):
         """Cache key should be a valid hex string."""
         request = {"text": "Test", "model": "test-model"}
         key = generate_cache_key(request)
 
         assert isinstance(key, str)
-        assert len(key) == 64  # SHA256 produces 64 hex chars
+        assert len(key) == 32  # xxh3-128 produces 32 hex chars
         # Should be valid hex
         int(key, 16)
 
@@ -433,3 +470,27 @@ class TestNParameterExtraction:
             "sampling_params": {"n": 5}
         }
         assert extract_n_parameter(request) == 5
+
+
+class TestIsDeterministic:
+    """Test detection of requests that always produce the same output."""
+
+    def test_greedy_is_deterministic(self):
+        """Temperature 0 is deterministic in both request formats."""
+        assert is_deterministic({"text": "Test", "sampling_params": {"temperature": 0}})
+        assert is_deterministic({"messages": [], "temperature": 0.0})
+
+    def test_seeded_sampling_is_deterministic(self):
+        """A fixed seed makes sampling deterministic."""
+        assert is_deterministic({"text": "Test", "sampling_params": {"temperature": 0.8, "sampling_seed": 1}})
+        assert is_deterministic({"messages": [], "temperature": 0.8, "seed": 1})
+
+    def test_sampling_without_seed_is_not_deterministic(self):
+        """Sampling without a seed, including the default temperature, is not deterministic."""
+        assert not is_deterministic({"text": "Test", "sampling_params": {"temperature": 0.8}})
+        assert not is_deterministic({"text": "Test"})
+
+    def test_null_seed_is_not_deterministic(self):
+        """An explicit null seed, as OpenAI clients send by default, does not count as seeded."""
+        assert not is_deterministic({"messages": [], "temperature": 0.8, "seed": None})
+        assert not is_deterministic({"text": "Test", "sampling_params": {"seed": None, "sampling_seed": None}})
@@ -5,41 +5,20 @@ Tests both SGLang native and OpenAI-compatible APIs.
 Requires wrapper server running at http://127.0.0.1:30001
 """
 
-import pytest
-import requests
-
-
-@pytest.fixture(scope="session")
-def wrapper_url():
-    """Wrapper server URL."""
-    return "http://127.0.0.1:30001"
-
-
-@pytest.fixture(scope="session")
-def is_wrapper_running(wrapper_url):
-    """Check if wrapper server is running."""
-    try:
-        response = requests.get(f"{wrapper_url}/health", timeout=2)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+import asyncio
 
+import httpx
+import pytest
 
-@pytest.fixture(scope="function")
-def clear_cache(wrapper_url, is_wrapper_running):
-    """Clear cache before and after each test."""
-    if not is_wrapper_running:
-        pytest.skip("Wrapper server not running")
 
-    requests.post(f"{wrapper_url}/cache/clear")
-    yield
-    requests.post(f"{wrapper_url}/cache/clear")
+# Every HTTP test needs the wrapper; clear its cache once per class
+pytestmark = pytest.mark.usefixtures("clean_cache_class")
 
 
 class TestOpenAICompletionsAPI:
     """Tests for OpenAI-compatible /v1/completions endpoint."""
 
-    def test_basic_completion(self, wrapper_url, clear_cache):
+    def test_basic_completion(self, http, wrapper_url):
         """Test basic OpenAI completion request."""
         request = {
             "model": "test-model",
@@ -48,7 +27,7 @@ class TestOpenAICompletionsAPI:
             "temperature": 0.0
         }
 
-        response = requests.post(f"{wrapper_url}/v1/completions", json=request)
+        response = http.post(f"{wrapper_url}/v1/completions", json=request)
         assert response.status_code == 200
 
         data = response.json()
@@ -59,7 +38,7 @@ class TestOpenAICompletionsAPI:
         assert "text" in data["choices"][0]
         assert len(data["choices"][0]["text"]) > 0
 
-    def test_completion_with_n_parameter(self, wrapper_url, clear_cache):
+    def test_completion_with_n_parameter(self, http, wrapper_url):
         """Test OpenAI completion with n > 1."""
         request = {
             "model": "test-model",
@@ -69,7 +48,7 @@ class TestOpenAICompletionsAPI:
             "n": 3
         }
 
-        response = requests.post(f"{wrapper_url}/v1/completions", json=request)
+        response = http.post(f"{wrapper_url}/v1/completions", json=request)
         assert response.status_code == 200
 
         data = response.json()
@@ -77,7 +56,7 @@ class TestOpenAICompletionsAPI:
         assert all("text" in choice for choice in data["choices"])
         assert all("index" in choice for choice in data["choices"])
 
-    def test_completion_caching(self, wrapper_url, clear_cache):
+    def test_completion_caching(self, http, wrapper_url):
         """Test that OpenAI completions are cached correctly."""
         request = {
             "model": "test-model",
@@ -87,27 +66,24 @@ class TestOpenAICompletionsAPI:
         }
 
         # First request
-        response1 = requests.post(f"{wrapper_url}/v1/completions", json=request)
+        response1 = http.post(f"{wrapper_url}/v1/completions", json=request)
         assert response1.status_code == 200
         data1 = response1.json()
 
         # Second request should hit cache
-        stats_before = requests.get(f"{wrapper_url}/cache/stats").json()
-        response2 = requests.post(f"{wrapper_url}/v1/completions", json=request)
+        response2 = http.post(f"{wrapper_url}/v1/completions", json=request)
         assert response2.status_code == 200
         data2 = response2.json()
-        stats_after = requests.get(f"{wrapper_url}/cache/stats").json()
 
         # Responses should be identical
         assert data1["choices"][0]["text"] == data2["choices"][0]["text"]
-        # Cache hits should increase
-        assert stats_after["hits"] > stats_before["hits"]
+        assert response2.headers["X-Cache"] == "HIT"
 
 
 class TestOpenAIChatCompletionsAPI:
     """Tests for OpenAI-compatible /v1/chat/completions endpoint."""
 
-    def test_basic_chat_completion(self, wrapper_url, clear_cache):
+    def test_basic_chat_completion(self, http, wrapper_url):
         """Test basic OpenAI chat completion request."""
         request = {
             "model": "test-model",
@@ -118,7 +94,7 @@ class TestOpenAIChatCompletionsAPI:
             "temperature": 0.0
         }
 
-        response = requests.post(f"{wrapper_url}/v1/chat/completions", json=request)
+        response = http.post(f"{wrapper_url}/v1/chat/completions", json=request)
         assert response.status_code == 200
 
         data = response.json()
@@ -130,7 +106,7 @@ class TestOpenAIChatCompletionsAPI:
         assert data["choices"][0]["message"]["role"] == "assistant"
         assert "content" in data["choices"][0]["message"]
 
-    def test_chat_with_multiple_messages(self, wrapper_url, clear_cache):
+    def test_chat_with_multiple_messages(self, http, wrapper_url):
         """Test chat completion with conversation history."""
         request = {
             "model": "test-model",
@@ -144,7 +120,7 @@ class TestOpenAIChatCompletionsAPI:
             "temperature": 0.0
         }
 
-        response = requests.post(f"{wrapper_url}/v1/chat/completions", json=request)
+        response = http.post(f"{wrapper_url}/v1/chat/completions", json=request)
         assert response.status_code == 200
 
         data = response.json()
@@ -152,7 +128,7 @@ class TestOpenAIChatCompletionsAPI:
         assert len(data["choices"]) == 1
         assert data["choices"][0]["message"]["role"] == "assistant"
 
-    def test_chat_with_n_parameter(self, wrapper_url, clear_cache):
+    def test_chat_with_n_parameter(self, http, wrapper_url):
         """Test chat completion with n > 1."""
         request = {
             "model": "test-model",
@@ -162,7 +138,7 @@ class TestOpenAIChatCompletionsAPI:
             "n": 2
         }
 
-        response = requests.post(f"{wrapper_url}/v1/chat/completions", json=request)
+        response = http.post(f"{wrapper_url}/v1/chat/completions", json=request)
         assert response.status_code == 200
 
         data = response.json()
@@ -170,7 +146,7 @@ class TestOpenAIChatCompletionsAPI:
         assert all("message" in choice for choice in data["choices"])
         assert all(choice["message"]["role"] == "assistant" for choice in data["choices"])
 
-    def test_chat_caching(self, wrapper_url, clear_cache):
+    def test_chat_caching(self, http, wrapper_url):
         """Test that chat completions are cached correctly."""
         request = {
             "model": "test-model",
@@ -180,27 +156,24 @@ class TestOpenAIChatCompletionsAPI:
         }
 
         # First request
-        response1 = requests.post(f"{wrapper_url}/v1/chat/completions", json=request)
+        response1 = http.post(f"{wrapper_url}/v1/chat/completions", json=request)
         assert response1.status_code == 200
         data1 = response1.json()
 
         # Second request should hit cache
-        stats_before = requests.get(f"{wrapper_url}/cache/stats").json()
-        response2 = requests.post(f"{wrapper_url}/v1/chat/completions", json=request)
+        response2 = http.post(f"{wrapper_url}/v1/chat/completions", json=request)
         assert response2.status_code == 200
         data2 = response2.json()
-        stats_after = requests.get(f"{wrapper_url}/cache/stats").json()
 
         # Responses should be identical
         assert data1["choices"][0]["message"]["content"] == data2["choices"][0]["message"]["content"]
-        # Cache hits should increase
-        assert stats_after["hits"] > stats_before["hits"]
+        assert response2.headers["X-Cache"] == "HIT"
 
 
 class TestCrossAPICompatibility:
     """Test that caching works correctly across different API formats."""
 
-    def test_same_request_different_apis(self, wrapper_url, clear_cache):
+    def test_same_request_different_apis(self, http, wrapper_url):
         """Test that the same logical request via different APIs uses the same cache."""
         # Make request via SGLang API
         sglang_request = {
@@ -210,7 +183,7 @@ class TestCrossAPICompatibility:
                 "max_new_tokens": 5
             }
         }
-        response1 = requests.post(f"{wrapper_url}/generate", json=sglang_request)
+        response1 = http.post(f"{wrapper_url}/generate", json=sglang_request)
         assert response1.status_code == 200
         data1 = response1.json()
 
@@ -220,25 +193,19 @@ class TestCrossAPICompatibility:
             "temperature": 0.0,
             "max_tokens": 5
         }
-        stats_before = requests.get(f"{wrapper_url}/cache/stats").json()
-        response2 = requests.post(f"{wrapper_url}/v1/completions", json=openai_request)
+        response2 = http.post(f"{wrapper_url}/v1/completions", json=openai_request)
         assert response2.status_code == 200
-        data2 = response2.json()
-        stats_after = requests.get(f"{wrapper_url}/cache/stats").json()
 
         # Should hit cache (same underlying request)
-        assert stats_after["hits"] > stats_before["hits"]
+        assert response2.headers["X-Cache"] == "HIT"
 
 
 class TestErrorHandling:
     """Test error handling in the HTTP server."""
 
-    def test_invalid_json(self, wrapper_url, is_wrapper_running):
+    def test_invalid_json(self, http, wrapper_url):
         """Test handling of invalid JSON."""
-        if not is_wrapper_running:
-            pytest.skip("Wrapper server not running")
-
-        response = requests.post(
+        response = http.post(
             f"{wrapper_url}/generate",
             data="invalid json",
             headers={"Content-Type": "application/json"}
@@ -246,14 +213,14 @@ class TestErrorHandling:
         # Should return an error (400 or 422)
         assert response.status_code in [400, 422]
 
-    def test_missing_required_fields(self, wrapper_url, clear_cache):
+    def test_missing_required_fields(self, http, wrapper_url):
         """Test handling of missing required fields."""
         # Request without text/prompt
         request = {
             "sampling_params": {"max_new_tokens": 10}
         }
 
-        response = requests.post(f"{wrapper_url}/generate", json=request)
+        response = http.post(f"{wrapper_url}/generate", json=request)
         # Should still work (might use empty text or fail gracefully)
         # The behavior depends on SGLang's handling
         assert response.status_code in [200, 400, 422, 502]
@@ -262,76 +229,65 @@ class TestErrorHandling:
 class TestConcurrency:
     """Test concurrent requests to the server."""
 
-    def test_concurrent_requests(self, wrapper_url, clear_cache):
-        """Test handling of concurrent requests."""
-        import concurrent.futures
-
-        request = {
-            "text": "Test concurrent",
-            "sampling_params": {"temperature": 0.0, "max_new_tokens": 5}
-        }
+    @pytest.mark.parametrize("num_prompts", [5, 50])
+    def test_concurrent_requests(self, http, wrapper_url, num_prompts):
+        """Test concurrent misses on distinct keys and on the same key."""
+        requests_by_prompt = [
+            {
+                "text": f"Test concurrent {num_prompts}-{i}",
+                "model": "test-model",
+                "sampling_params": {"temperature": 0.0, "max_new_tokens": 5}
+            }
+            for i in range(num_prompts)
+        ]
 
-        def make_request():
-            response = requests.post(f"{wrapper_url}/generate", json=request)
-            return response.status_code == 200
+        async def make_requests():
+            # One event loop and one connection pool instead of a thread per request
+            async with httpx.AsyncClient(base_url=wrapper_url, timeout=60.0) as client:
+                # Every prompt is sent twice at once: distinct keys miss concurrently
+                # and the duplicates exercise coalescing on a single key
+                return await asyncio.gather(
+                    *(client.post("/generate", json=request) for request in requests_by_prompt * 2)
+                )
 
-        # Make 5 concurrent requests
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(make_request) for _ in range(5)]
-            results = [f.result() for f in concurrent.futures.as_completed(futures)]
+        responses = asyncio.run(make_requests())
 
-        # All should succeed
-        assert all(results)
+        # All should succeed, and both copies of a prompt share one response
+        assert all(response.status_code == 200 for response in responses)
+        texts = [response.json()["text"] for response in responses]
+        assert texts[:num_prompts] == texts[num_prompts:]
 
-        # Should have cache hits
-        stats = requests.get(f"{wrapper_url}/cache/stats").json()
-        assert stats["hits"] >= 4  # First is miss, rest are hits
+        # Every prompt is now cached
+        for request in requests_by_prompt:
+            response = http.post(f"{wrapper_url}/generate", json=request)
+            assert response.headers["X-Cache"] == "HIT"
 
 
 class TestParameterVariations:
     """Test various sampling parameter combinations."""
 
-    def test_different_temperatures(self, wrapper_url, clear_cache):
-        """Test that different temperatures create different cache entries."""
-        base_request = {
-            "text": "Test temperature",
-            "sampling_params": {"max_new_tokens": 10}
-        }
-
-        # Request with temp 0.0
-        req1 = base_request.copy()
-        req1["sampling_params"] = {**base_request["sampling_params"], "temperature": 0.0}
-        requests.post(f"{wrapper_url}/generate", json=req1)
-
-        # Request with temp 1.0
-        req2 = base_request.copy()
-        req2["sampling_params"] = {**base_request["sampling_params"], "temperature": 1.0}
-        requests.post(f"{wrapper_url}/generate", json=req2)
-
-        # Should have 2 different cache entries
-        stats = requests.get(f"{wrapper_url}/cache/stats").json()
-        assert stats["num_keys"] == 2
-
-    def test_n_parameter_exclusion_from_cache_key(self, wrapper_url, clear_cache):
-        """Test that n parameter doesn't affect cache key."""
-        base_request = {
-            "text": "Test n parameter",
-            "sampling_params": {
-                "temperature": 0.5,
-                "max_new_tokens": 10,
-                "n": 1
+    @pytest.mark.serial
+    @pytest.mark.parametrize(
+        "params_a,params_b,expected_keys",
+        [
+            ({"temperature": 0.0}, {"temperature": 1.0}, 2),
+            ({"temperature": 0.5, "max_new_tokens": 10}, {"temperature": 0.5, "max_new_tokens": 15}, 2),
+            ({"temperature": 0.5, "n": 1}, {"temperature": 0.5, "n": 2}, 1),
+        ],
+        ids=["temperature", "max_new_tokens", "n_excluded"]
+    )
+    def test_cache_key_semantics(
+        self, http, wrapper_url, clear_cache, params_a, params_b, expected_keys
+    ):
+        """Test which sampling parameters split the cache key (n never does)."""
+        for params in (params_a, params_b):
+            request = {
+                "text": "Test cache key",
+                "model": "test-model",
+                "sampling_params": {"max_new_tokens": 10, **params}
             }
-        }
-
-        # Request with n=1
-        requests.post(f"{wrapper_url}/generate", json=base_request)
-
-        # Request with n=2 (should use same cache key)
-        req2 = base_request.copy()
-        req2["sampling_params"] = base_request["sampling_params"].copy()
-        req2["sampling_params"]["n"] = 2
-        requests.post(f"{wrapper_url}/generate", json=req2)
+            response = http.post(f"{wrapper_url}/generate", json=request)
+            assert response.status_code == 200
 
-        # Should still have only 1 cache key
-        stats = requests.get(f"{wrapper_url}/cache/stats").json()
-        assert stats["num_keys"] == 1
+        stats = http.get(f"{wrapper_url}/cache/stats").json()
+        assert stats["num_keys"] == expected_keys
@@ -294,8 +294,6 @@ class TestModelPersistence:
 
     def test_cache_persists_with_multiple_models(self):
         """Cache should persist and reload correctly with multiple models."""
-        import time
-
         with tempfile.TemporaryDirectory() as tmpdir:
             # First cache instance
             cache1 = CacheManager(cache_dir=tmpdir)
@@ -308,9 +306,6 @@ class TestModelPersistence:
                     "sampling_params": {"temperature": 0.7}
                 }
                 cache1.put(request, [{"text": f"Response from {model}"}])
-
-            # Wait for async writes
-            time.sleep(0.2)
             cache1.shutdown()
 
             # Second cache instance - should load from disk
@@ -136,8 +136,6 @@ class TestMultiModelCacheManager:
 
     def test_cache_accumulation_per_model(self):
         """Each model should accumulate its own responses."""
-        import time
-
         with tempfile.TemporaryDirectory() as tmpdir:
             cache = CacheManager(cache_dir=tmpdir)
 
@@ -160,9 +158,6 @@ class TestMultiModelCacheManager:
                 {"text": "Claude response 3"}
             ])
 
-            # Give async writer a moment to process
-            time.sleep(0.1)
-
             # Verify each model has its own count
             # Need to request with appropriate n values
             request_gpt4_n2 = {**request_gpt4, "sampling_params": {"temperature": 0.8, "n": 2}}
@@ -178,8 +173,6 @@ class TestMultiModelCacheManager:
 
     def test_persistence_with_multiple_models(self):
         """Cache should persist and reload correctly with multiple models."""
-        import time
-
         with tempfile.TemporaryDirectory() as tmpdir:
             # First cache instance
             cache1 = CacheManager(cache_dir=tmpdir)
@@ -192,9 +185,6 @@ class TestMultiModelCacheManager:
 
             for i, req in enumerate(requests):
                 cache1.put(req, [{"text": f"Response from {req['model']}"}])
-
-            # Wait for async writes to complete
-            time.sleep(0.2)
             cache1.shutdown()
 
             # Second cache instance (loads from disk)
@@ -238,20 +228,17 @@ class TestMultiModelCacheManager:
             ])
 
             # Request n=2 from gpt-4 (should return 2, need 0)
-            request_gpt4_n2 = {**request_gpt4, "sampling_params": {"temperature": 0.7, "n": 2}}
-            cached, needed = cache.get(request_gpt4_n2)
+            cached, needed = cache.get(request_gpt4, n=2)
             assert len(cached) == 2
             assert needed == 0
 
             # Request n=5 from gpt-4 (should return 3, need 2)
-            request_gpt4_n5 = {**request_gpt4, "sampling_params": {"temperature": 0.7, "n": 5}}
-            cached, needed = cache.get(request_gpt4_n5)
+            cached, needed = cache.get(request_gpt4, n=5)
             assert len(cached) == 3
             assert needed == 2
 
             # Request n=3 from gpt-3.5 (should return 2, need 1)
-            request_gpt35_n3 = {**request_gpt35, "sampling_params": {"temperature": 0.7, "n": 3}}
-            cached, needed = cache.get(request_gpt35_n3)
+            cached, needed = cache.get(request_gpt35, n=3)
             assert len(cached) == 2
             assert needed == 1
 
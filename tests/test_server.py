@@ -0,0 +1,259 @@
+"""
+Unit tests for CachedSGLangServer request handling.
+
+The upstream SGLang server is replaced with an httpx.MockTransport, so these
+tests run without any servers.
+"""
+
+import asyncio
+import gzip
+import json
+
+import httpx
+
+from sglang_cached.server import CachedSGLangServer, openai_to_sglang
+
+
+def make_server(cache_dir, upstream_calls, in_flight=None):
+    """
+    Create a server whose upstream /generate records its calls and answers slowly.
+
+    If `in_flight` is given, its "peak" entry records the most upstream calls
+    that were in progress at once.
+    """
+    if in_flight is None:
+        in_flight = {}
+    in_flight.update(current=0, peak=0)
+
+    async def handler(request):
+        body = json.loads(request.content)
+        upstream_calls.append(body)
+        call_number = len(upstream_calls)
+        in_flight["current"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+        await asyncio.sleep(0.05)
+        in_flight["current"] -= 1
+        n = body["sampling_params"]["n"]
+        responses = [{"text": f"r{call_number}-{i}"} for i in range(n)]
+        return httpx.Response(200, json=responses[0] if n == 1 else responses)
+
+    return CachedSGLangServer(
+        "http://sglang", cache_dir=cache_dir, verbose=False, transport=httpx.MockTransport(handler)
+    )
+
+
+class TestRequestCoalescing:
+    """Test that concurrent identical misses share one upstream request."""
+
+    def test_identical_misses_share_one_upstream_call(self, temp_cache_dir):
+        """Test that identical concurrent requests trigger a single SGLang call."""
+        upstream_calls = []
+        server = make_server(temp_cache_dir, upstream_calls)
+        request = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 1}}
+
+        async def run():
+            results = await asyncio.gather(*(server._handle_generate(request) for _ in range(5)))
+            await server.shutdown()
+            return results
+
+        results = asyncio.run(run())
+
+        assert len(upstream_calls) == 1
+        assert all(response == {"text": "r1-0"} for response, _ in results)
+
+    def test_larger_request_fetches_only_the_shortfall(self, temp_cache_dir):
+        """Test that a request needing more than is in flight fetches only the remainder."""
+        upstream_calls = []
+        in_flight = {}
+        server = make_server(temp_cache_dir, upstream_calls, in_flight)
+        request_n1 = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 1}}
+        request_n3 = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 3}}
+
+        async def run():
+            results = await asyncio.gather(
+                server._handle_generate(request_n1),
+                server._handle_generate(request_n3),
+            )
+            await server.shutdown()
+            return results
+
+        (single, _), (multiple, _) = asyncio.run(run())
+
+        # The shortfall is fetched alongside the in-flight request, not after it
+        assert in_flight["peak"] == 2
+        assert [call["sampling_params"]["n"] for call in upstream_calls] == [1, 2]
+        assert single == {"text": "r1-0"}
+        assert [r["text"] for r in multiple] == ["r1-0", "r2-0", "r2-1"]
+        assert server.cache.get_stats()["misses"] == 2
+
+
+class TestDeterministicOnly:
+    """Test the opt-in mode that only caches deterministic requests."""
+
+    def test_sampled_requests_bypass_the_cache(self, temp_cache_dir):
+        """Test that sampled requests are forwarded uncached and counted as bypassed."""
+        upstream_calls = []
+        server = make_server(temp_cache_dir, upstream_calls)
+        server.cache_deterministic_only = True
+        sampled = {"text": "Hello", "model": "test-model", "sampling_params": {"temperature": 0.8}}
+        greedy = {"text": "Hello", "model": "test-model", "sampling_params": {"temperature": 0}}
+
+        async def run():
+            for request in (sampled, sampled, greedy, greedy):
+                await server._handle_generate(request)
+            await server.shutdown()
+
+        asyncio.run(run())
+
+        stats = server.cache.get_stats()
+        assert len(upstream_calls) == 3
+        assert stats["cache_bypassed"] == 2
+        assert stats["num_keys"] == 1
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+class TestStreaming:
+    """Test that streamed requests bypass the cache."""
+
+    def test_stream_is_relayed_and_not_cached(self, temp_cache_dir):
+        """Test that a stream=true request is passed through without caching."""
+        chunks = [b'data: {"text": "Hel"}\n\n', b'data: {"text": "Hello"}\n\n', b"data: [DONE]\n\n"]
+
+        async def upstream_body():
+            for chunk in chunks:
+                yield chunk
+
+        async def handler(request):
+            assert json.loads(request.content) == {"text": "Hi", "stream": True}
+            return httpx.Response(
+                200, content=upstream_body(), headers={"content-type": "text/event-stream"}
+            )
+
+        server = CachedSGLangServer(
+            "http://sglang",
+            cache_dir=temp_cache_dir,
+            verbose=False,
+            transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                response = await client.post(
+                    "/generate", json={"text": "Hi", "model": "test-model", "stream": True}
+                )
+            await server.shutdown()
+            return response
+
+        response = asyncio.run(run())
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.content == b"".join(chunks)
+        assert response.headers["X-Cache"] == "BYPASS"
+        assert server.cache.get_stats()["num_keys"] == 0
+
+    def test_compressed_completions_stream_is_decoded(self, temp_cache_dir):
+        """Test that a gzip-encoded upstream stream reaches the client decoded."""
+        body = b'data: {"choices": [{"text": "Hello"}]}\n\ndata: [DONE]\n\n'
+
+        async def handler(request):
+            assert request.url.path == "/v1/completions"
+            return httpx.Response(
+                200,
+                content=gzip.compress(body),
+                headers={"content-type": "text/event-stream", "content-encoding": "gzip"}
+            )
+
+        server = CachedSGLangServer(
+            "http://sglang",
+            cache_dir=temp_cache_dir,
+            verbose=False,
+            transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                response = await client.post(
+                    "/v1/completions", json={"prompt": "Hi", "model": "test-model", "stream": True}
+                )
+            await server.shutdown()
+            return response
+
+        response = asyncio.run(run())
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.content == body
+        assert response.headers["X-Cache"] == "BYPASS"
+        assert server.cache.get_stats()["num_keys"] == 0
+
+
+    def test_stream_without_model_is_rejected(self, temp_cache_dir):
+        """Test that a streamed request missing the model gets the same 400 as an unstreamed one."""
+        upstream_calls = []
+        server = make_server(temp_cache_dir, upstream_calls)
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                responses = [
+                    await client.post(path, json={**body, "stream": stream})
+                    for path, body in (
+                        ("/generate", {"text": "Hi"}),
+                        ("/v1/completions", {"prompt": "Hi"}),
+                        ("/v1/chat/completions", {"messages": [{"role": "user", "content": "Hi"}]}),
+                    )
+                    for stream in (False, True)
+                ]
+            await server.shutdown()
+            return responses
+
+        responses = asyncio.run(run())
+
+        assert [response.status_code for response in responses] == [400] * 6
+        assert upstream_calls == []
+
+
+class TestCacheHeader:
+    """Test that responses report how the cache served them."""
+
+    def test_x_cache_header(self, temp_cache_dir):
+        """Test that X-Cache reports MISS, HIT and PARTIAL for each lookup."""
+        server = make_server(temp_cache_dir, [])
+        request = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 1}}
+        request_n2 = {"text": "Hello", "model": "test-model", "sampling_params": {"n": 2}}
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                statuses = [
+                    (await client.post("/generate", json=body)).headers["X-Cache"]
+                    for body in (request, request, request_n2)
+                ]
+            await server.shutdown()
+            return statuses
+
+        assert asyncio.run(run()) == ["MISS", "HIT", "PARTIAL"]
+
+
+class TestOpenAIConversion:
+    """Test OpenAI to SGLang request conversion."""
+
+    def test_chat_messages_flatten_to_prompt(self):
+        """Test that chat messages flatten to the same prompt string used in cache keys."""
+        request = {
+            "model": "test-model",
+            "messages": [
+                {"role": "system", "content": "Be brief."},
+                {"role": "tool", "content": "ignored"},
+                {"role": "user", "content": "Hi"},
+            ],
+            "max_tokens": 5,
+        }
+
+        converted = openai_to_sglang(request, is_chat=True)
+
+        assert converted["text"] == "System: Be brief.\n\nUser: Hi\n\nAssistant:"
+        assert converted["sampling_params"] == {"max_new_tokens": 5}